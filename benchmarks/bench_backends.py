@@ -0,0 +1,69 @@
+"""
+Thread vs process execution backend on N files.
+
+Every file goes through calc_bg -> burst_search -> fuse_bursts, the
+CPU-bound part of a typical session, with one worker thread per file as
+`NodeWorker` does. In 'processes' mode the methods are executed through
+`process_backend.ProcessBackend`, photon arrays are passed by shared memory.
+Worker process start-up is reported separately. Usage:
+
+    python benchmarks/bench_backends.py --files 8 --photons 2000000
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fretbursts
+
+import synthetic
+import process_backend
+
+MODES = ('threads', 'processes')
+
+
+def pipeline(call, data):
+    data = call(data, 'calc_bg', fretbursts.bg.exp_fit, time_s=30, tail_min_us=300)
+    data = call(data, 'burst_search', m=10, L=20, F=6)
+    data = call(data, 'fuse_bursts', ms=0)
+    return data
+
+
+def run_mode(mode, datasets, workers):
+    if mode == 'threads':
+        call = process_backend.call_method
+    else:
+        t0 = time.perf_counter()
+        backend = process_backend.ProcessBackend(workers)
+        # start all worker processes before timing
+        list(ThreadPoolExecutor(workers).map(
+            lambda data: backend.call(data, 'copy'), datasets[:workers]))
+        print(f"{'':>9}  worker start-up {time.perf_counter() - t0:6.2f} s")
+        call = backend.call
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(lambda data: pipeline(call, data), datasets))
+    elapsed = time.perf_counter() - t0
+    nbursts = sum(int(data.num_bursts[0]) for data in results)
+    print(f"{mode:>9}: {len(datasets)} files in {elapsed:6.2f} s, {nbursts} bursts")
+    if mode == 'processes':
+        backend.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--photons', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    datasets = [synthetic.make_data(args.photons, seed=i) for i in range(args.files)]
+    print(f"{args.files} files x {args.photons} photons, {args.workers} workers")
+    timings = {mode: run_mode(mode, datasets, args.workers) for mode in MODES}
+    print(f"speed-up: {timings['threads'] / timings['processes']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+BVA: per-burst Python loop vs cumulative sum + `np.add.reduceat`.
+
+Both implementations run on the same synthetic bursts for every sub-burst
+size and their results are checked to be equal:
+
+    python benchmarks/bench_bva.py --photons 20000000 --n 5 7 10
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import fretbursts
+
+import synthetic
+from misc.bva import bva_sigma_E
+
+
+def bva_sigma_E_loop(n, bursts, DexAem_mask):
+    """What BVAPlotterNode computed before the vectorized engine"""
+    E_sub_std = []
+    for burst in bursts:
+        E_sub_bursts = []
+        startlist = range(burst.istart, burst.istop + 2 - n, n)
+        stoplist = [i + n for i in startlist]
+        for start, stop in zip(startlist, stoplist):
+            A_D = DexAem_mask[start:stop].sum()
+            E_sub_bursts.append(A_D / n)
+        E_sub_std.append(np.std(E_sub_bursts))
+    return np.asarray(E_sub_std)
+
+
+def best_time(func, repeat, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--photons', type=int, default=5_000_000)
+    parser.add_argument('--n', type=int, nargs='+', default=[7],
+                        help='photons per sub-burst')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    data = synthetic.make_burst_data(args.photons)
+    print(f"{data.num_bursts[0]} bursts from {args.photons} photons "
+          f"in {time.perf_counter() - t0:.1f} s")
+
+    ph_d = data.get_ph_times(ph_sel=fretbursts.Ph_sel(Dex='DAem'))
+    bursts_d = data.mburst[0].recompute_index_reduce(ph_d)
+    Dex_mask = data.get_ph_mask(ph_sel=fretbursts.Ph_sel(Dex='DAem'))
+    DexAem_mask = data.get_ph_mask(ph_sel=fretbursts.Ph_sel(Dex='Aem'))
+    DexAem_mask_d = DexAem_mask[Dex_mask]
+
+    for n in args.n:
+        with warnings.catch_warnings():
+            # np.std of the bursts shorter than n
+            warnings.simplefilter('ignore', RuntimeWarning)
+            t_loop, E_loop = best_time(bva_sigma_E_loop, args.repeat,
+                                       n, bursts_d, DexAem_mask_d)
+        t_vec, E_vec = best_time(bva_sigma_E, args.repeat, n, bursts_d, DexAem_mask_d)
+        assert np.allclose(E_loop, E_vec, equal_nan=True), 'results differ'
+        print(f"n={n:3d}: loop {t_loop * 1e3:9.1f} ms, vectorized {t_vec * 1e3:7.1f} ms, "
+              f"speedup {t_loop / t_vec:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
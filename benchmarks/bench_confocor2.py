@@ -0,0 +1,88 @@
+"""
+ConfoCor2 RAW decoding: `asarray` + argsort merge vs streaming `photons`.
+
+A synthetic RAW file of the requested size is written first (kept with
+--keep). Every mode runs in a fresh subprocess and reports its peak RSS.
+The legacy path needs tens of times the file size in memory, run only the
+streaming decoder for multi-GB files:
+
+    python benchmarks/bench_confocor2.py --mbytes 4096 --modes streaming
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic
+from misc.fcsfiles import ConfoCor2Raw
+from bench_fbsdata_copy import peak_rss_mb
+
+MODES = ('legacy', 'streaming')
+
+
+def decode_legacy(path):
+    """What LSM510Node.load did before the streaming decoder"""
+    fcs = ConfoCor2Raw(path)
+    times_acceptor, times_donor = fcs.asarray()
+    df = np.hstack([np.vstack([times_donor, np.zeros(times_donor.size)]),
+                    np.vstack([times_acceptor, np.ones(times_acceptor.size)])]).T
+    df_sorted = df[np.argsort(df[:, 0])].T
+    timestamps = df_sorted[0].astype('int64')
+    detectors = df_sorted[1].astype('bool')
+    fcs.close()
+    return timestamps, detectors
+
+
+def decode_streaming(path):
+    with ConfoCor2Raw(path) as fcs:
+        return fcs.photons()
+
+
+def run_mode(mode, path):
+    decode = decode_legacy if mode == 'legacy' else decode_streaming
+    base_rss = peak_rss_mb()
+    t0 = time.perf_counter()
+    timestamps, detectors = decode(path)
+    elapsed = time.perf_counter() - t0
+    print(f"{mode:>9}: {len(timestamps)} photons in {elapsed:7.2f} s, "
+          f"peak RSS {peak_rss_mb():9.1f} MB (before {base_rss:7.1f} MB), "
+          f"file {os.path.getsize(path) / 1024**2:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mbytes', type=int, default=256, help='size of the RAW file')
+    parser.add_argument('--event-prob', type=float, default=0.02,
+                        help='probability of an event per tick and channel')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--file', default=None, help='existing RAW file to decode')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic file')
+    parser.add_argument('--mode', choices=MODES, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run_mode(args.mode, args.file)
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f'synthetic_{args.mbytes}MB.raw')
+        t0 = time.perf_counter()
+        synthetic.write_confocor2_raw(path, args.mbytes * 1024**2 // 2,
+                                      event_prob=args.event_prob)
+        print(f"wrote {path} in {time.perf_counter() - t0:.1f} s")
+    try:
+        for mode in args.modes:
+            subprocess.run([sys.executable, __file__, '--mode', mode, '--file', path],
+                           check=True)
+    finally:
+        if args.file is None and not args.keep:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
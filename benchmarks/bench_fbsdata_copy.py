@@ -0,0 +1,69 @@
+"""
+Peak memory of FBSData fan-out: full deepcopy vs copy-on-write `FBSData.copy`.
+
+Every mode runs in a fresh subprocess so that the reported peak RSS
+(`ru_maxrss`) belongs to that mode only. Usage:
+
+    python benchmarks/bench_fbsdata_copy.py --photons 5000000 --fanout 6
+"""
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+import synthetic
+from fbs_data import FBSData
+
+MODES = ('deepcopy', 'cow')
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_mode(mode, n_photons, fanout):
+    fbsdata = FBSData(synthetic.make_burst_data(n_photons), 'synthetic')
+    base_rss = peak_rss_mb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    copies = []
+    for _ in range(fanout):
+        if mode == 'deepcopy':
+            copies.append(FBSData(deepcopy(fbsdata.data), fbsdata.path, id=fbsdata.id))
+        else:
+            copies.append(fbsdata.copy())
+    elapsed = time.perf_counter() - t0
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{mode:>9}: {fanout} copies in {elapsed*1e3:8.1f} ms, "
+          f"traced peak {traced_peak / 1024**2:8.1f} MB, "
+          f"peak RSS {peak_rss_mb():8.1f} MB (before copies {base_rss:8.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--photons', type=int, default=5_000_000)
+    parser.add_argument('--fanout', type=int, default=6)
+    parser.add_argument('--mode', choices=MODES, default=None,
+                        help='run a single mode in this process')
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run_mode(args.mode, args.photons, args.fanout)
+        return
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, '--mode', mode,
+                        '--photons', str(args.photons),
+                        '--fanout', str(args.fanout)], check=True)
+
+
+if __name__ == '__main__':
+    main()
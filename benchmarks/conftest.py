@@ -0,0 +1,104 @@
+"""
+Fixtures of the pytest-benchmark suite (`test_pipeline.py`).
+
+The synthetic files are written once per session in a temporary folder,
+their size is set with --photons. Every benchmark also reports the peak
+of the memory traced by `tracemalloc` during one extra call (numpy
+buffers included), in the JSON output (`extra_info.peak_mb`) and at the
+end of the run.
+"""
+import os
+import tracemalloc
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import synthetic  # noqa: E402  (adds src/fretGUI to sys.path)
+
+MEMORY_PEAKS = dict()
+
+
+def pytest_addoption(parser):
+    parser.addoption('--photons', type=int, default=500_000,
+                     help='photons of the synthetic files')
+
+
+@pytest.fixture(scope='session')
+def n_photons(request):
+    return request.config.getoption('--photons')
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp('synthetic')
+
+
+@pytest.fixture(scope='session')
+def phhdf5_path(data_dir, n_photons):
+    path = str(data_dir / 'smfret.hdf5')
+    synthetic.write_photon_hdf5(path, n_photons)
+    return path
+
+
+@pytest.fixture(scope='session')
+def alex_path(data_dir, n_photons):
+    path = str(data_dir / 'usalex.hdf5')
+    synthetic.write_photon_hdf5(path, n_photons, alex=True)
+    return path
+
+
+@pytest.fixture(scope='session')
+def confocor2_path(data_dir, n_photons):
+    path = str(data_dir / 'confocor2.raw')
+    event_prob = 0.02
+    # every word has 8 event bits
+    synthetic.write_confocor2_raw(path, int(n_photons / (8 * event_prob)), event_prob)
+    return path
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    from Qt import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture(scope='session')
+def graph(qapp):
+    from NodeGraphQt import NodeGraph
+    return NodeGraph()
+
+
+@pytest.fixture
+def make_node(graph):
+    """Create a node of the given class in the benchmark graph"""
+    def make(node_class):
+        if node_class.type_ not in graph.registered_nodes():
+            graph.register_node(node_class)
+        return graph.create_node(node_class.type_, push_undo=False)
+    return make
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """Benchmark `func(*args)` and record its memory peak"""
+    def run(func, *args, rounds=5):
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['peak_mb'] = peak / 1024**2
+        MEMORY_PEAKS[request.node.name] = peak
+        return benchmark.pedantic(func, args=args, rounds=rounds)
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not MEMORY_PEAKS:
+        return
+    terminalreporter.section('memory peak (tracemalloc)')
+    width = max(len(name) for name in MEMORY_PEAKS)
+    for name, peak in MEMORY_PEAKS.items():
+        terminalreporter.write_line(f"{name:<{width}} {peak / 1024**2:10.1f} MB")
@@ -0,0 +1,147 @@
+"""
+Synthetic smFRET photon streams for the benchmarks.
+
+Photons are a Poisson background in both channels plus short bursts of
+donor/acceptor photons with a fixed FRET efficiency, stored in a
+`fretbursts.Data` object the same way `LSM510Node.load` does it.
+"""
+import os
+import sys
+
+import numpy as np
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'fretGUI')
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import fretbursts  # noqa: E402
+
+CLK_P = 50e-9  # ConfoCor2 clock, 20 MHz
+
+
+def make_timestamps(n_photons, bg_rate=4000., burst_rate=20., burst_size=60,
+                    burst_width_s=1e-3, E=0.5, seed=0):
+    """Return sorted timestamps (int64, clock units) and acceptor mask
+
+    Args:
+        n_photons (int): approximate total number of photons
+        bg_rate (float): background rate per channel, cps
+        burst_rate (float): bursts per second
+        burst_size (int): mean number of photons per burst
+        burst_width_s (float): burst duration, s
+        E (float): FRET efficiency of burst photons
+        seed (int): random seed
+
+    Returns:
+        (timestamps, a_em): int64 array of timestamps and bool array marking
+        acceptor photons
+    """
+    rng = np.random.default_rng(seed)
+    photons_per_s = 2 * bg_rate + burst_rate * burst_size
+    duration = n_photons / photons_per_s
+    n_ticks = int(duration / CLK_P)
+
+    n_bg = rng.poisson(2 * bg_rate * duration)
+    bg_times = rng.integers(0, n_ticks, n_bg)
+    bg_acceptor = rng.random(n_bg) < 0.5
+
+    n_bursts = rng.poisson(burst_rate * duration)
+    burst_starts = rng.integers(0, n_ticks, n_bursts)
+    sizes = rng.poisson(burst_size, n_bursts)
+    width = int(burst_width_s / CLK_P)
+    burst_times = np.repeat(burst_starts, sizes) + rng.integers(0, width, sizes.sum())
+    burst_acceptor = rng.random(sizes.sum()) < E
+
+    timestamps = np.concatenate([bg_times, burst_times]).astype('int64')
+    a_em = np.concatenate([bg_acceptor, burst_acceptor])
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], a_em[order]
+
+
+def make_data(n_photons, seed=0, **kwargs):
+    """Return a non-ALEX smFRET `fretbursts.Data` with `n_photons` photons"""
+    timestamps, a_em = make_timestamps(n_photons, seed=seed, **kwargs)
+    data = fretbursts.Data(ph_times_m=[timestamps], A_em=[a_em],
+                           clk_p=CLK_P, alternated=False, nch=1,
+                           fname=f'synthetic_{n_photons}_{seed}',
+                           meas_type='smFRET')
+    data.name = data.fname
+    return data
+
+
+def make_burst_data(n_photons, seed=0, **kwargs):
+    """Return synthetic `Data` with background and bursts already computed"""
+    data = make_data(n_photons, seed=seed, **kwargs)
+    data.calc_bg(fretbursts.bg.exp_fit, time_s=30, tail_min_us=300)
+    data.burst_search(m=10, L=20, F=6)
+    return data
+
+
+def make_alex_timestamps(n_photons, alex_period=4000, S=0.5, seed=0, **kwargs):
+    """Return timestamps and detectors (0 donor, 1 acceptor) of a us-ALEX stream
+
+    The photons of `make_timestamps` are moved to the donor (first half)
+    or acceptor (second half) excitation period of `alex_period` ticks.
+    Burst and background photons are acceptor-excited with probability
+    1 - S; acceptor-excited photons are detected in the acceptor channel.
+    """
+    timestamps, a_em = make_timestamps(n_photons, seed=seed, **kwargs)
+    rng = np.random.default_rng(seed + 1)
+    half = alex_period // 2
+    a_ex = rng.random(timestamps.size) >= S
+    timestamps = (timestamps - timestamps % alex_period
+                  + rng.integers(0, half, timestamps.size) + a_ex * half)
+    detectors = (a_em | a_ex).astype('uint8')
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], detectors[order]
+
+
+def write_photon_hdf5(path, n_photons, alex=False, alex_period=4000, seed=0):
+    """Write a synthetic smFRET (or us-ALEX) Photon-HDF5 file"""
+    import phconvert
+    if alex:
+        timestamps, detectors = make_alex_timestamps(n_photons, alex_period, seed=seed)
+        measurement_specs = dict(
+            measurement_type='smFRET-usALEX', alex_period=alex_period,
+            alex_excitation_period1=(0, alex_period // 2),
+            alex_excitation_period2=(alex_period // 2, alex_period),
+            detectors_specs=dict(spectral_ch1=[0], spectral_ch2=[1]))
+        excitation = dict(excitation_alternated=[True, True], excitation_cw=[True, True],
+                          excitation_wavelengths=[532e-9, 635e-9])
+    else:
+        timestamps, a_em = make_timestamps(n_photons, seed=seed)
+        detectors = a_em.astype('uint8')
+        measurement_specs = dict(measurement_type='smFRET',
+                                 detectors_specs=dict(spectral_ch1=[0], spectral_ch2=[1]))
+        excitation = dict(excitation_alternated=[False], excitation_cw=[True],
+                          excitation_wavelengths=[532e-9])
+    data = dict(
+        _filename=path, description='synthetic smFRET photons',
+        photon_data=dict(timestamps=timestamps, detectors=detectors,
+                         timestamps_specs=dict(timestamps_unit=CLK_P),
+                         measurement_specs=measurement_specs),
+        setup=dict(num_pixels=2, num_spots=1, num_spectral_ch=2, num_polarization_ch=1,
+                   num_split_ch=1, modulated_excitation=alex, lifetime=False,
+                   detection_wavelengths=[580e-9, 680e-9], **excitation),
+        identity=dict(author='FretBurstStudio benchmarks', author_affiliation='none'))
+    phconvert.hdf5.save_photon_hdf5(data, h5_fname=path, overwrite=True, close=True)
+
+
+def write_confocor2_raw(path, n_words, event_prob=0.02, chunk_words=1 << 22, seed=0):
+    """Write a synthetic ConfoCor2 RAW file with `n_words` data words
+
+    Every word is a random clock increment and an event byte whose 8 bits
+    (4 ticks x 2 channels) are set with probability `event_prob`. Written in
+    chunks, so multi-GB files can be made with little memory.
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1 << np.arange(8, dtype='u1')
+    with open(path, 'wb') as f:
+        f.write(b"ConfoCor 2 - Raw data file 1.0")
+        for start in range(0, n_words, chunk_words):
+            n = min(chunk_words, n_words - start)
+            words = np.empty((n, 2), dtype='u1')
+            words[:, 0] = rng.integers(0, 256, n, dtype='u1')
+            bits = rng.random((n, 8)) < event_prob
+            words[:, 1] = (bits * weights).sum(axis=1, dtype='u1')
+            words.tofile(f)
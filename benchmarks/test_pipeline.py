@@ -0,0 +1,201 @@
+"""
+pytest-benchmark suite of the pipeline stages, on synthetic files.
+
+Every stage runs through the GUI node that does it (loaders, analysis,
+selector and plot nodes) on datasets without a cache key, so results are
+never taken from `FBSDataCash` and the copy-on-write copy of the input is
+part of the timing, as in a first run. Plot nodes are timed from their
+input to the rasterized figure.
+
+    pip install pytest-benchmark
+    python -m pytest benchmarks/test_pipeline.py --photons 2000000
+    python -m pytest benchmarks/test_pipeline.py --benchmark-autosave --benchmark-compare
+
+Memory peaks are printed at the end and stored in the JSON output.
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import fretbursts  # noqa: E402
+import numpy as np  # noqa: E402
+
+import operations  # noqa: E402
+import synthetic  # noqa: E402
+from fbs_data import FBSData  # noqa: E402
+from misc import burst_table  # noqa: E402
+from singletons import FBSDataCash  # noqa: E402
+import custom_nodes.custom_nodes as cn  # noqa: E402
+import custom_nodes.selector_nodes as sn  # noqa: E402
+from custom_widgets.plot_widget import RENDER_POOL  # noqa: E402
+
+BG_PARAMS = {'Period, s': 30, 'Min. lag, μs': 300}
+SEARCH_PARAMS = {'m, Photon search window': 10, 'L, Minimal Burst size': 20,
+                 'F, Min. Burst rate to bg. ratio': 6, 'Channel': 'DAem'}
+CORRECTION_PARAMS = {'Gamma': 1.0, 'Leakage': 0.0, 'Direct ex.': 0.0}
+
+
+@pytest.fixture(scope='module')
+def loaded(phhdf5_path):
+    return operations.load('Loaders.PhHDF5Node', phhdf5_path, {})
+
+
+@pytest.fixture(scope='module')
+def with_bg(loaded):
+    return operations.run('Analysis.CalcBGNode', operations.cow_copy(loaded), BG_PARAMS)
+
+
+@pytest.fixture(scope='module')
+def with_bursts(with_bg):
+    data = operations.cow_copy(with_bg)
+    data = operations.run('Analysis.BurstSearchNodeFromBG', data, SEARCH_PARAMS)
+    return operations.run('Analysis.CorrectionsNode', data, CORRECTION_PARAMS)
+
+
+def fbsdata_of(data, path='synthetic'):
+    return FBSData(data, path)
+
+
+@pytest.mark.benchmark(group='load')
+@pytest.mark.parametrize('kind', ['smFRET', 'usALEX'])
+def test_load_photon_hdf5(measure, make_node, request, kind):
+    path = request.getfixturevalue('phhdf5_path' if kind == 'smFRET' else 'alex_path')
+    node = make_node(cn.PhHDF5Node)
+    measure(node.load, path)
+
+
+@pytest.mark.benchmark(group='load')
+def test_load_confocor2(measure, make_node, confocor2_path):
+    node = make_node(cn.LSM510Node)
+    measure(node.load, confocor2_path)
+
+
+@pytest.mark.benchmark(group='data')
+def test_make_hash(measure, make_node, with_bursts):
+    node = make_node(cn.BurstSearchNodeFromBG)
+    fbsdata = fbsdata_of(with_bursts)
+    fbsdata.cache_key = FBSDataCash.chain_key('synthetic', 'Loaders.PhHDF5Node')
+    measure(FBSDataCash.make_hash, node, fbsdata)
+
+
+@pytest.mark.benchmark(group='data')
+def test_fbsdata_copy(measure, with_bursts):
+    measure(fbsdata_of(with_bursts).copy)
+
+
+@pytest.mark.benchmark(group='data')
+def test_burst_table(measure, with_bursts):
+    measure(burst_table.compute_burst_table, with_bursts)
+
+
+@pytest.mark.benchmark(group='analysis')
+def test_alex(measure, make_node, alex_path):
+    node = make_node(cn.AlexNode)
+    measure(node.execute, make_node(cn.PhHDF5Node).load(alex_path))
+
+
+@pytest.mark.benchmark(group='analysis')
+def test_calc_bg(measure, make_node, loaded):
+    node = make_node(cn.CalcBGNode)
+    node.time_s_spinbox.set_value(BG_PARAMS['Period, s'])
+    measure(node.execute, fbsdata_of(loaded))
+
+
+@pytest.mark.benchmark(group='analysis')
+@pytest.mark.parametrize('node_class', [cn.BurstSearchNodeRate, cn.BurstSearchNodeFromBG],
+                         ids=lambda node_class: node_class.__name__)
+def test_burst_search(measure, make_node, with_bg, node_class):
+    node = make_node(node_class)
+    measure(node.execute, fbsdata_of(with_bg))
+
+
+@pytest.mark.benchmark(group='analysis')
+def test_corrections(measure, make_node, with_bursts):
+    node = make_node(cn.CorrectionsNode)
+    node.gamma_spinbox.set_value(0.8)
+    # the factors are applied when the Data is read
+    measure(lambda fbsdata: node.execute(fbsdata)[0].data, fbsdata_of(with_bursts))
+
+
+@pytest.fixture(scope='module')
+def multispot(n_photons):
+    """Two-spot Data with bursts and per-spot gamma factors (chi_ch)"""
+    spots = [synthetic.make_timestamps(n_photons // 2, seed=seed) for seed in (0, 1)]
+    data = fretbursts.Data(ph_times_m=[timestamps for timestamps, _ in spots],
+                           A_em=[a_em for _, a_em in spots], clk_p=synthetic.CLK_P,
+                           alternated=False, nch=2, fname='synthetic_multispot',
+                           meas_type='smFRET')
+    data.calc_bg(fretbursts.bg.exp_fit, time_s=BG_PARAMS['Period, s'], tail_min_us=300)
+    data.burst_search(m=10, L=20, F=6)
+    data.chi_ch = np.array([0.8, 1.25])
+    return data
+
+
+@pytest.mark.benchmark(group='analysis')
+def test_corrections_multispot(measure, multispot):
+    gamma, leakage = 0.7, 0.05
+    # what fretbursts computes, counting the photons of the bursts again
+    expected = operations.cow_copy(multispot)
+    expected.gamma = gamma
+    expected.leakage = leakage
+    expected.calc_fret()
+    corrected = measure(operations.apply_corrections, multispot, gamma, leakage, 0.)
+    for field in ('na', 'nt', 'E'):
+        for ich in range(multispot.nch):
+            assert np.allclose(corrected[field][ich], expected[field][ich],
+                               rtol=1e-12, atol=0), f'{field} of spot {ich} differs'
+
+
+@pytest.mark.benchmark(group='selectors')
+@pytest.mark.parametrize('node_class', [sn.BurstSelectorSizeNode, sn.BurstSelectorENode,
+                                        sn.BurstSelectorWidthNode, sn.BurstSelectorNABGNode],
+                         ids=lambda node_class: node_class.__name__)
+def test_selector(measure, make_node, with_bursts, node_class):
+    node = make_node(node_class)
+    measure(node.execute, fbsdata_of(with_bursts))
+
+
+def select_chain(nodes, fbsdata):
+    """Selectors one after the other, then the selected Data as a plot reads it"""
+    for node in nodes:
+        fbsdata = node.execute(fbsdata)[0]
+    return fbsdata.data
+
+
+@pytest.mark.benchmark(group='selectors')
+def test_selector_chain(measure, make_node, with_bursts):
+    nodes = [make_node(node_class) for node_class in (
+        sn.BurstSelectorSizeNode, sn.BurstSelectorENode,
+        sn.BurstSelectorWidthNode, sn.BurstSelectorNABGNode)]
+    measure(select_chain, nodes, fbsdata_of(with_bursts))
+
+
+def render(qapp, node, source, fbsdata):
+    """What a run does to a plot node: new input, redraw, rasterize"""
+    node.invalidate()
+    fbsdata.prev_nodeid = id(source)
+    node.execute(fbsdata)
+    node.on_refresh_canvas()
+    RENDER_POOL.waitForDone()
+    qapp.processEvents()
+
+
+@pytest.mark.benchmark(group='plots')
+@pytest.mark.parametrize('node_class, render_mode', [
+    (cn.BGFitPlotterNode, None),
+    (cn.EHistPlotterNode, None),
+    (cn.HistBurstWidthPlotterNode, None),
+    (cn.ScatterFretSizePlotterNode, 'Markers'),
+    (cn.ScatterFretSizePlotterNode, 'Density'),
+    (cn.BVAPlotterNode, 'Density'),
+], ids=lambda value: getattr(value, '__name__', value))
+def test_plot(measure, make_node, qapp, with_bg, with_bursts, node_class, render_mode):
+    node = make_node(node_class)
+    if node_class is cn.BGFitPlotterNode:
+        source, data = make_node(cn.CalcBGNode), with_bg
+    else:
+        source, data = make_node(sn.BurstSelectorSizeNode), with_bursts
+    source.set_output(0, node.input(0))
+    if render_mode is not None:
+        node.render_box.set_value(render_mode)
+    measure(render, qapp, node, source, fbsdata_of(data))
@@ -4,8 +4,7 @@ from abc import  abstractmethod, ABC
 from fbs_data import FBSData
 from node_workers import NodeWorker
 from Qt.QtCore import QThreadPool   
-from singletons import ThreadSignalManager, EventDebouncer, NodeStateManager
-from collections import deque
+from singletons import ThreadSignalManager, EventDebouncer, NodeStateManager, GraphTopology
 from .resizable_node_item import ResizablePlotNodeItem
 from Qt.QtCore import QTimer  # pyright: ignore[reportMissingModuleSource]
             
@@ -15,10 +14,25 @@ class AbstractExecutable(BaseNode, ABC):
    
     def __init__(self, *args, **kwargs):
         BaseNode.__init__(self, *args, **kwargs)   
+        # datasets returned by the last run, by FBSData id; None if never run
+        self.last_outputs = None
         
     def are_ports_acceptable(self, inport, outport) -> bool:
           return inport.color == outport.color
 
+    def invalidate(self):
+        """Forget the results of the last run, the node is about to be rerun"""
+        self.last_outputs = dict()
+        
+    def store_output(self, fbsdata: FBSData):
+        if self.last_outputs is None:
+            self.last_outputs = dict()
+        self.last_outputs[fbsdata.id] = fbsdata
+
+    def params(self) -> dict:
+        """Widget values by widget name, as stored in saved sessions"""
+        return {name: widget.get_value() for name, widget in self.widgets().items()}
+
     @abstractmethod    
     def execute(self, data: FBSData=None) -> list[FBSData]:
         pass
@@ -27,29 +41,21 @@ class AbstractExecutable(BaseNode, ABC):
         return len(self.input_ports()) == 0
            
     def iter_parent_nodes(self):
-        for port in self.input_ports():
-            connected_ports = port.connected_ports()
-            for connected_port in connected_ports:
-                connected_node = connected_port.node()
-                yield connected_node
+        yield from GraphTopology().parents(self)
                 
     def iter_children_nodes(self):
-        for port in self.output_ports():
-            connected_ports = port.connected_ports()
-            for connected_port in connected_ports:
-                connected_node = connected_port.node()
-                yield connected_node
+        yield from GraphTopology().children(self)
                 
     def bfs(self):
-        visited = set([self])
-        q = deque([self])
-        while len(q) != 0:
-            cur_node = q.popleft()
-            for nextnode in cur_node.iter_children_nodes():
-                if nextnode in visited:
-                    continue
-                visited.add(nextnode)
-                yield nextnode
+        yield from GraphTopology().descendants(self)
+
+    def on_input_connected(self, in_port, out_port):
+        GraphTopology().connect(in_port, out_port)
+        return super().on_input_connected(in_port, out_port)
+
+    def on_input_disconnected(self, in_port, out_port):
+        GraphTopology().disconnect(in_port, out_port)
+        return super().on_input_disconnected(in_port, out_port)
                 
     def are_ports_acceptable(self, inport, outport) -> bool:
         return inport.color == outport.color
@@ -65,17 +71,7 @@ class AbstractRecomputable(AbstractExecutable):
         self.__rejected_nodes = set()
         
     def find_roots(self):
-        if self.is_root():
-            return [self]
-        root_nodes = []
-        self.__find_roots(self, root_nodes)   
-        return root_nodes
-    
-    def __find_roots(self, node, root_nodes):
-        for parent in node.iter_parent_nodes():
-            if parent.is_root():
-                root_nodes.append(parent)
-            self.__find_roots(parent, root_nodes)
+        return list(GraphTopology().root_ancestors(self))
             
     def on_state_changed(self, state):
         if state:
@@ -132,11 +128,15 @@ class AbstractRecomputable(AbstractExecutable):
         return super().on_input_disconnected(in_port, out_port)
     
     def on_connection(self, event):
-        self.on_widget_triggered()
+        self.request_rerun()
             
     def on_widget_triggered(self):
         print("TRIGGERED", type(self))
-        ThreadSignalManager().run_btn_clicked.emit()
+        self.request_rerun()
+        
+    def request_rerun(self):
+        """Rerun this node and everything below it (see `GraphEngene.run_from`)"""
+        ThreadSignalManager().node_changed.emit(self)
 
 
 
@@ -8,21 +8,31 @@ from singletons import NodeStateManager
 
 
 from fbs_data import FBSData
-from singletons import FBSDataCash
+from singletons import FBSDataCash, ExecutionBackend, NodeProfiler, GraphTopology
+import operations
+from run_token import RunToken, check_cancelled
 from Qt.QtCore import Signal  # pyright: ignore[reportMissingModuleSource]
 from Qt.QtWidgets import QAction, QFileDialog  # pyright: ignore[reportMissingModuleSource]
 from singletons import ThreadSignalManager
 from abc import abstractmethod
 from NodeGraphQt import BaseNode
 import numpy as np
+from fretbursts import Ph_sel
 from fretbursts.burstlib import Data
 from collections import Counter
-from misc import enable_legend_toggle
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import time
+from misc import enable_legend_toggle, plot_density, replace_markers_with_density
+from misc import burst_table, bva, histograms
 import pandas as pd
 import seaborn as sns
 
 
 class AbstractLoader(AbstractRecomputable):
+    # files loaded at the same time by one loader node
+    MAX_PARALLEL_LOADS = 4
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
@@ -34,7 +44,7 @@ class AbstractLoader(AbstractRecomputable):
         self.file_widget = path_selector.PathSelectorWidgetWrapper(self.view)  
         self.add_custom_widget(self.file_widget, tab='Custom')  
         
-        self.opened_paths = dict()  # path_hash -> FBSData
+        self.opened_paths = dict()  # hash of (path, loader parameters) -> FBSData
         self.path_to_id = dict()    # path -> id mapping
         
         # Connect to paths_added signal to assign IDs immediately (use DirectConnection for synchronous execution)
@@ -55,6 +65,15 @@ class AbstractLoader(AbstractRecomputable):
     @abstractmethod
     def load(self, path: str, id: int = None, checked: bool=False) -> FBSData:
         pass
+
+    def load_params(self) -> dict:
+        """Widget values the files are loaded with, without the file list"""
+        return {name: widget.get_value() for name, widget in self.widgets().items()
+                if widget is not self.file_widget}
+
+    def __opened_key(self, path: str, load_params: dict) -> int:
+        # a file opened with other loader parameters (e.g. 'Loading') is loaded again
+        return hash((path, tuple(sorted(load_params.items()))))
     
     def _format_metadata_tooltip(self, fbsdata: FBSData) -> str:
         """Format metadata from FBSData into a tooltip string"""
@@ -118,7 +137,8 @@ class AbstractLoader(AbstractRecomputable):
     
     def execute(self, fbsdata: FBSData=None):
         selected_paths = self.file_widget.get_value()
-        self.__delete_closed_files(selected_paths)
+        load_params = self.load_params()
+        self.__delete_closed_files(selected_paths, load_params)
         
         # Ensure all selected paths have IDs assigned
         from singletons import FBSDataIDGenerator
@@ -128,9 +148,9 @@ class AbstractLoader(AbstractRecomputable):
                 new_id = FBSDataIDGenerator().get_next_id()
                 self.path_to_id[path] = new_id
         
-        data_list = []
+        to_load = []
         for cur_path in selected_paths:
-            path_hash = hash(cur_path)
+            path_hash = self.__opened_key(cur_path, load_params)
             # Get the pre-assigned ID for this path
             assigned_id = self.path_to_id[cur_path]
             
@@ -138,32 +158,59 @@ class AbstractLoader(AbstractRecomputable):
             if not rowwidget.is_checked():
                 continue
             
-            rowwidget = self.file_widget.get_rowwidget(assigned_id)
             if path_hash in self.opened_paths:
                 # Use existing FBSData (which already has an ID)
                 existing_fbsdata = self.opened_paths[path_hash]
-                fbsdata_copy = existing_fbsdata.copy()
-                fbsdata_copy.set_checked(rowwidget.is_checked())
-                data_list.append(fbsdata_copy)
+                existing_fbsdata.set_checked(rowwidget.is_checked())
                 # Update tooltip for loaded file
                 tooltip_text = self._format_metadata_tooltip(existing_fbsdata)
                 self.file_widget.update_tooltip_for_path(cur_path, tooltip_text)
+                yield existing_fbsdata
             else:
-                # Load new FBSData with the pre-assigned ID
-                loaded_fbsdata = self.load(cur_path, id=assigned_id, checked=rowwidget.is_checked())
-                self.opened_paths[path_hash] = loaded_fbsdata.copy()
-                # self.__wire_fbsdata(self.opened_paths[path_hash])
-                data_list.append(loaded_fbsdata)
-                # Update tooltip for newly loaded file
-                tooltip_text = self._format_metadata_tooltip(loaded_fbsdata)
-                self.file_widget.update_tooltip_for_path(cur_path, tooltip_text)
+                to_load.append((cur_path, assigned_id, rowwidget.is_checked()))
         
         # Update the path widget with IDs (in case any were missing)
         self.file_widget.update_path_ids(self.path_to_id)
-        return data_list
+        if len(to_load) == 0:
+            return
+
+        # Load new files concurrently, each one goes downstream as soon as it is ready.
+        # A file is submitted only when another one was taken, so a consumer that
+        # stops pulling (backpressure in NodeWorker) also stops the loading.
+        to_load = iter(to_load)
+        token = RunToken.current() or RunToken()
+        with ThreadPoolExecutor(max_workers=self.MAX_PARALLEL_LOADS) as pool:
+            futures = dict()
+            for args in islice(to_load, self.MAX_PARALLEL_LOADS):
+                futures[pool.submit(self.__load_with_key, token, load_params, *args)] = args[0]
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                cur_path = futures.pop(future)
+                for args in islice(to_load, 1):
+                    futures[pool.submit(self.__load_with_key, token, load_params, *args)] = args[0]
+                loaded_fbsdata = future.result()
+                self.opened_paths[self.__opened_key(cur_path, load_params)] = loaded_fbsdata
+                # Update tooltip for newly loaded file
+                tooltip_text = self._format_metadata_tooltip(loaded_fbsdata)
+                self.file_widget.update_tooltip_for_path(cur_path, tooltip_text)
+                yield loaded_fbsdata
+
+    def __load_with_key(self, token, load_params, path, id, checked):
+        with token.bind(), NodeProfiler().span(self, phase='load') as outputs:
+            token.check()
+            fbsdata = self.load(path, id=id, checked=checked)
+            outputs.append(fbsdata)
+        # the Data keeps its file name (fname, name) down the chain: identical
+        # files at different paths must not share cached results, nor files
+        # loaded with other parameters (in-memory vs memory-mapped photons)
+        fbsdata.cache_key = FBSDataCash.chain_key(FBSData.file_fingerprint(path), self.type_,
+                                                  [os.path.abspath(path), load_params])
+        return fbsdata
     
-    def __delete_closed_files(self, selected_paths: list):
-        selected_hashes = set([hash(path) for path in selected_paths])
+    def __delete_closed_files(self, selected_paths: list, load_params: dict):
+        # files opened with other loader parameters are released too
+        selected_hashes = set([self.__opened_key(path, load_params) for path in selected_paths])
         saved = set(self.opened_paths.keys())
         for_kill = saved - selected_hashes
         if len(for_kill) > 0:
@@ -179,6 +226,7 @@ class AbstractLoader(AbstractRecomputable):
         
     
 
+
              
 class PhHDF5Node(AbstractLoader):
 
@@ -187,15 +235,20 @@ class PhHDF5Node(AbstractLoader):
 
     def __init__(self):
         super().__init__() 
+        node_builder = NodeBuilder(self)
+        self.loading_box = node_builder.build_combobox(
+            'Loading',
+            ['In memory', 'Memory-mapped'],
+            'In memory',
+            tooltip='Memory-mapped: photons are stored uncompressed in a cache folder once and paged in from disk when needed, for files larger than RAM')
     
     def load(self, path, id=None, checked=False):
-        data = fretbursts.loader.photon_hdf5(path)
+        data = operations.load(self.type_, path, self.params())
         fbsdata = FBSData(data, path, id=id, checked=checked)
         return fbsdata   
         
         
 class LSM510Node(AbstractLoader):
-    from misc.fcsfiles import ConfoCor2Raw
     __identifier__ = 'Loaders'
     NODE_NAME  = 'Confocor2 RAW'
 
@@ -203,23 +256,7 @@ class LSM510Node(AbstractLoader):
         super().__init__() 
     
     def load(self, path: str, id=None, checked=False):
-        fcs=self.ConfoCor2Raw(path)
-        times_acceptor, times_donor = fcs.asarray()
-        fcs.frequency
-
-        df = np.hstack([np.vstack( [   times_donor, np.zeros(   times_donor.size)] ),
-                        np.vstack( [times_acceptor,  np.ones(times_acceptor.size)] )]).T
-
-        df_sorted = df[np.argsort(df[:,0])].T
-        timestamps=df_sorted[0].astype('int64')
-        timestamps_unit = 1.0/fcs.frequency
-
-        detectors=df_sorted[1].astype('bool')
-        
-        data = fretbursts.Data(ph_times_m=[timestamps], A_em=[detectors],
-                                     clk_p=timestamps_unit, alternated=False,nch=1,
-                                     fname=path,meas_type='smFRET')  
-        data.name = os.path.basename(path)
+        data = operations.load(self.type_, path, self.params(), abort=check_cancelled)
         fbsdata = FBSData(data, path, id=id, checked=checked)
         return fbsdata   
         
@@ -235,7 +272,8 @@ class AlexNode(AbstractRecomputable):
     
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData) -> list[FBSData]:
-        fretbursts.loader.alex_apply_period(fbsdata.data, False)
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
         return [fbsdata]
     
     
@@ -252,14 +290,11 @@ class CalcBGNode(AbstractRecomputable):
         self.time_s_spinbox = node_builder.build_int_spinbox('Period, s', [1, 1000, 10],60, tooltip='Time for BG calculation, s', min_width=80)
         self.tail_spinbox = node_builder.build_int_spinbox('Min. lag, μs', [1, 1000, 100], 300,tooltip='Threshold in μs for photon waiting times', min_width=80)
 
-        
-    def __calc_bg(self, data, time_s, tail_min_us):
-        data.data.calc_bg(fretbursts.bg.exp_fit, time_s=time_s, tail_min_us=tail_min_us)
     
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData) -> list[FBSData]:
-        self.__calc_bg(fbsdata, time_s = self.time_s_spinbox.get_value(),
-                       tail_min_us = self.tail_spinbox.get_value())
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
         return [fbsdata]
 
 class CorrectionsNode(AbstractRecomputable):
@@ -296,15 +331,11 @@ class CorrectionsNode(AbstractRecomputable):
             min_width=self.fields_width)
 
     
-    @FBSDataCash().fbscash
+    @FBSDataCash().fbscash(copy_input=False)
     def execute(self, fbsdata: FBSData) -> list[FBSData]:
-        fbsdata.data.gamma = self.gamma_spinbox.get_value()
-        fbsdata.data.leakage = self.leakage_spinbox.get_value()
-        fbsdata.data.dir_ex = self.dir_ex_spinbox.get_value()
-        if hasattr(fbsdata.data, 'num_bursts') and fbsdata.data.num_bursts[0] > 0:
-            # Recalculate E values for existing bursts
-            fbsdata.data.calc_fret()
-        return [fbsdata]
+        # the factors are a pending spec of the dataset, E and S are
+        # recomputed from the burst counts when read (`FBSData.correct`)
+        return [fbsdata.correct(operations.correction_spec(self.params()))]
     
 class DitherNode(AbstractRecomputable):
     __identifier__ = 'Analysis'
@@ -329,7 +360,8 @@ class DitherNode(AbstractRecomputable):
         
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData) -> list[FBSData]:
-        fbsdata.data.dither(self.dither_spinbox.get_value()) 
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
         return [fbsdata]
     
 class BurstSearchNodeRate(AbstractRecomputable):
@@ -357,15 +389,11 @@ class BurstSearchNodeRate(AbstractRecomputable):
             [1000, 100000, 1000],
             8000,
             tooltip = "Minimum rate in cps for burst start.")
-        
-    def __burst_search(self, fbdata: str, m, L, min_rate_cps):
-        fbdata.data.burst_search(m=m, L=L, min_rate_cps = min_rate_cps)
        
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData):
-        self.__burst_search(fbsdata, m=self.m_slider.get_value(),
-                                    L=self.L_slider.get_value(),
-                                    min_rate_cps=self.int_slider.get_value())
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
         return [fbsdata]
 
 class FuseBurstsNode(AbstractRecomputable):
@@ -388,7 +416,30 @@ class FuseBurstsNode(AbstractRecomputable):
        
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData):
-        fbsdata.data = fbsdata.data.fuse_bursts(ms=self.delay_slider.get_value())
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
+        return [fbsdata]
+
+class BVANode(AbstractRecomputable):
+    __identifier__ = 'Analysis'
+    NODE_NAME = 'BVA'
+    
+    def __init__(self):
+        super().__init__()
+        node_builder = NodeBuilder(self)
+        
+        self.add_input('inport')
+        self.add_output('outport')
+        self.n_spinbox = node_builder.build_int_spinbox(
+            'n, Photons per sub-burst',
+            [2, 50, 1],
+            bva.DEFAULT_N,
+            tooltip='Number of Dex photons in each sub-burst used to compute the std.dev. of E.')
+        
+    @FBSDataCash().fbscash
+    def execute(self, fbsdata: FBSData):
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
         return [fbsdata]
         
 class BurstSearchNodeFromBG(AbstractRecomputable):
@@ -425,17 +476,12 @@ class BurstSearchNodeFromBG(AbstractRecomputable):
             ['DAem','Dem','Aem'],
             'DAem',
             '“photon selection” to be used for burst search, DAem - both donor and Acceptor, Dem - only donor, Aem - only acceptor')
-        
-    def __burst_search(self, fbdata: str, m: int,L: int,F: int,sel):
-        fbdata.data.burst_search(m=m,L=L,F=F,ph_sel=fretbursts.Ph_sel(Dex=sel))
        
     @FBSDataCash().fbscash
     def execute(self, fbsdata: FBSData):
-        self.__burst_search(fbsdata,m=self.m_slider.get_value(),
-                                    L=self.L_slider.get_value(),
-                                    F=self.F_slider.get_value(),
-                                    sel = self.sel_box.get_value())
-        return [fbsdata]    
+        fbsdata.data = operations.run(self.type_, fbsdata.data, self.params(),
+                                      ExecutionBackend().call)
+        return [fbsdata]
           
         
 class AbstractContentNode(ResizableContentNode):
@@ -447,6 +493,12 @@ class AbstractContentNode(ResizableContentNode):
         ThreadSignalManager().all_thread_finished.connect(self.on_refresh_canvas)
         ThreadSignalManager().all_thread_finished.connect(self.on_check_ports)
         self.__prevnodeid_data_map = dict()
+        # (producer node id, FBSData id) -> FBSData, kept until the node is rerun
+        self.__inputs = dict()
+        self.__dirty = False
+        # seconds spent building and rasterizing the last plot
+        self.redraw_time = None
+        self.__canvas_wired = False
         
         print(inport_color, "INPORT")
         
@@ -464,25 +516,84 @@ class AbstractContentNode(ResizableContentNode):
     def has_plot_data(self) -> bool:
         return len(self.data_to_plot) != 0
         
+    def invalidate(self):
+        super().invalidate()
+        self.__inputs = dict()
+        self.__dirty = True
+        
+    def on_widget_triggered(self):
+        # plot widgets only change the presentation: redraw from the kept
+        # inputs on the GUI thread, the graph is not run
+        if self.last_outputs is None:
+            # never run, there is nothing to redraw from
+            return self.request_rerun()
+        if self.__dirty:
+            # a run is on its way, it redraws with the new values
+            return
+        self.__dirty = True
+        self.on_refresh_canvas()
+        
     def on_refresh_canvas(self):
+        if not self.__dirty:
+            # not rerun, the plot is up to date
+            return
+        self.__dirty = False
+        if not self.__canvas_wired:
+            # the plot widget is built by subclasses, after __init__ here
+            self.plot_widget.canvas.rendered.connect(self.on_rendered)
+            self.__canvas_wired = True
+        inputs = dict(self.__inputs)
+        self.data_to_plot = list(inputs.values())
+        self.__prevnodeid_data_map = {fbsdata: prev_nodeid 
+                                      for (prev_nodeid, _), fbsdata in inputs.items()}
         if self.has_plot_data():
             print("WAS EXECUTED", type(self))
-            self._on_refresh_canvas()
-            self.plot_widget.canvas.draw()
-            self.data_to_plot.clear()
+            state = self.prepare_refresh()
+            self.plot_widget.canvas.render_async(lambda: self.__profiled_refresh(state))
         else:
             print("WAS NOT EXECUTED", type(self))   
             self.__on_plot_data_clear()
-            self.plot_widget.canvas.draw()
+            
+    def on_rendered(self, seconds: float):
+        self.redraw_time = seconds
+        
+    def __profiled_refresh(self, state: dict):
+        with NodeProfiler().span(self, phase='redraw'):
+            self._on_refresh_canvas(state)
+
+    def prepare_refresh(self) -> dict:
+        """Read the node widgets for the next `_on_refresh_canvas`.
+
+        Runs on the GUI thread and returns the state to draw, which is
+        passed to `_on_refresh_canvas` on the render thread (see
+        `AsyncFigureCanvas`). A render still queued keeps its own state, so
+        the two threads share no attributes of the node;
+        `_on_refresh_canvas` must not touch Qt widgets.
+        """
+        return dict()
         
     @abstractmethod
-    def _on_refresh_canvas(self):
+    def _on_refresh_canvas(self, state: dict):
         pass
     
+    def clear_axes(self):
+        """Single cleared axes of the plot figure.
+
+        The axes are kept between redraws, building new ones costs more
+        than drawing the plot.
+        """
+        fig = self.plot_widget.figure
+        if len(fig.axes) == 1:
+            ax = fig.axes[0]
+            ax.cla()
+            return ax
+        fig.clear()
+        return fig.add_subplot()
+    
     def __on_plot_data_clear(self):
         self.data_to_plot.clear()
-        self.plot_widget.figure.clear()
         self.__prevnodeid_data_map.clear()
+        self.plot_widget.canvas.render_async(self.plot_widget.figure.clear)
         
     def get_input_port(self, fbsdata: FBSData) -> NodeGraphQt.Port:
         """function returns port from which current fbsdata came
@@ -496,18 +607,11 @@ class AbstractContentNode(ResizableContentNode):
         prev_nodeid = self.__prevnodeid_data_map.get(fbsdata)
         if prev_nodeid is None:
             return None
-        
-        connected_inports = self.connected_input_nodes()
-        for port, connected_nodes in connected_inports.items():
-            connected_node_ids = set([id(node) for node in connected_nodes])
-            if prev_nodeid in connected_node_ids:
-                return port
-        return None
+        return GraphTopology().input_port(self, prev_nodeid)
     
     def execute(self, fbsdata: FBSData=None):
-        self.__prevnodeid_data_map[fbsdata] = fbsdata.prev_nodeid
         if fbsdata is not None:
-            self.data_to_plot.append(fbsdata)
+            self.__inputs[(fbsdata.prev_nodeid, fbsdata.id)] = fbsdata
         return [fbsdata] 
     
     def __get_port_name(self, connected_inputs) -> str:
@@ -588,33 +692,64 @@ class BaseSingleFilePlotterNode(AbstractContentNode):
             tooltip="Select an option"
         )
 
-    def _on_refresh_canvas(self):
-        fig = self.plot_widget.figure
-        fig.clear()
-        ax = fig.add_subplot()
-
+    def prepare_refresh(self):
+        state = super().prepare_refresh()
         map_name_to_data = {}
         self.data_to_plot.sort(key = lambda x: x.id)
         for cur_data in self.data_to_plot:
-            fname = os.path.basename(cur_data.data.fname)
+            # the selected Data is built on the render thread, for the
+            # plotted file only
+            fname = os.path.basename(cur_data.fname)
             inport_name = self.get_input_port(cur_data).name()
             
             fbid = cur_data.id
-            map_name_to_data[f'{inport_name}:{fbid}, {fname}'] = cur_data.data
+            map_name_to_data[f'{inport_name}:{fbid}, {fname}'] = cur_data
 
         self.items_to_plot.set_items(list(map_name_to_data.keys()))
         selected_val = self.items_to_plot.get_value()
-        selected_data = map_name_to_data.get(selected_val)
+        state['selected_data'] = map_name_to_data.get(selected_val)
+        return state
+
+    def _on_refresh_canvas(self, state):
+        ax = self.clear_axes()
+        selected = state['selected_data']
+        selected_data = selected.data if selected is not None else None
 
         # Avoid accidental binding and ensure we pass a Data instance.
         plot_func = self.PLOT_FUNC.__func__ if isinstance(self.PLOT_FUNC, staticmethod) else self.PLOT_FUNC
         if plot_func is None or selected_data is None or not isinstance(selected_data, Data):
-            self.plot_widget.canvas.draw()
             return
 
         fretbursts.dplot(selected_data, plot_func, ax=ax, **self.PLOT_KWARGS)
         # fig.tight_layout()
-        self.plot_widget.canvas.draw()
+
+class BaseScatterPlotterNode(BaseSingleFilePlotterNode):
+    """Scatter plot of a burst quantity against another one
+
+    In the 'Density' mode the markers drawn by `PLOT_FUNC` are replaced by
+    their smoothed 2D histogram, which costs the same for any number of
+    bursts.
+    """
+    NODE_NAME = 'BaseScatterPlotterNode'
+    RENDER_MODES = ['Markers', 'Density']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.render_box = self.node_builder.build_combobox(
+            'Render',
+            self.RENDER_MODES,
+            'Markers',
+            tooltip='Density: draw a smoothed 2D histogram of the bursts instead of one marker per burst')
+
+    def prepare_refresh(self):
+        state = super().prepare_refresh()
+        state['render_mode'] = self.render_box.get_value()
+        return state
+
+    def _on_refresh_canvas(self, state):
+        super()._on_refresh_canvas(state)
+        if state['render_mode'] == 'Density':
+            replace_markers_with_density(self.plot_widget.figure.axes[0])
 
 class BaseMultiFilePlotterNode(AbstractContentNode):
     __identifier__ = 'Plot'
@@ -635,6 +770,9 @@ class BaseMultiFilePlotterNode(AbstractContentNode):
         self.PLOT_KWARGS = {}
         
         self.node_builder.build_plot_widget('plot_widget', mpl_width=4.0, mpl_height=3.0)
+        self.ax = None
+        # (FBSData, legend prefix) of the plotted files, for the burst export
+        self.plotted = []
 
         plot_widget = self.get_widget('plot_widget').plot_widget
         toolbar = plot_widget.toolbar
@@ -648,59 +786,108 @@ class BaseMultiFilePlotterNode(AbstractContentNode):
         copy_data_action.triggered.connect(lambda: self.export(export_type='copy'))
         toolbar.addAction(copy_data_action)
         toolbar.widgetForAction(copy_data_action).setStyleSheet("border: 1px solid gray;")
+
+        save_bursts_action = QAction('save bursts', toolbar)
+        save_bursts_action.setToolTip('Save the burst table (one row per burst) of every plotted file')
+        save_bursts_action.triggered.connect(lambda: self.export(export_type='file', content='bursts'))
+        toolbar.addAction(save_bursts_action)
+        toolbar.widgetForAction(save_bursts_action).setStyleSheet("border: 1px solid gray;")
     
     def update_plot_kwargs(self):
         pass
 
-    def _on_refresh_canvas(self):
-        self.plot_widget.figure.clf()
-        self.ax = self.plot_widget.figure.add_subplot()
-        self.ax.cla()
-
-        # Avoid accidental binding and ensure we have a valid plot function
-        plot_func = self.PLOT_FUNC.__func__ if isinstance(self.PLOT_FUNC, staticmethod) else self.PLOT_FUNC
-        if plot_func is None:
-            self.plot_widget.canvas.draw()
-            return
+    def prepare_refresh(self):
+        state = super().prepare_refresh()
         self.update_plot_kwargs()
-
+        state['plot_kwargs'] = dict(self.PLOT_KWARGS)
         self.data_to_plot.sort(key = lambda x: x.id)
 
+        # the burst tables and the selected Data are built on the render
+        # thread, see `plot_items`
+        self.plotted = []
         for cur_data in self.data_to_plot:
-            if not isinstance(cur_data.data, Data):
+            if not cur_data.has_bursts():
                 continue
-            
-            # Call fretbursts.dplot for each item in data_to_plot
-            fretbursts.dplot(cur_data.data, plot_func, ax=self.ax, **self.PLOT_KWARGS)
-
             if len(self.connected_input_nodes())==2:
-                name = f'{cur_data.data.name}, N {cur_data.data.num_bursts[0]}'
+                prefix = ''
             else:
-                inport_name = self.get_input_port(cur_data).name()
-                name = f'{inport_name}: {cur_data.data.name}, N {cur_data.data.num_bursts[0]}'
+                prefix = f'{self.get_input_port(cur_data).name()}: '
+            self.plotted.append((cur_data, prefix))
+        state['plotted'] = list(self.plotted)
+        return state
+
+    @staticmethod
+    def legend_label(cur_data: FBSData, prefix: str, tables: list) -> str:
+        return f'{prefix}{cur_data.name}, N {len(tables[0])}'
+
+    def plot_items(self, plotted: list) -> list:
+        """What `_on_refresh_canvas` draws for every (FBSData, legend
+        prefix) of `plotted`, see `plot_item`"""
+        items = []
+        for cur_data, prefix in plotted:
+            name = self.legend_label(cur_data, prefix, cur_data.burst_tables())
+            items.append(self.plot_item(cur_data, name))
+        return items
+
+    def plot_item(self, cur_data: FBSData, name: str):
+        """What `_on_refresh_canvas` draws for the dataset `cur_data`"""
+        return (cur_data.data, name)
+
+    def _on_refresh_canvas(self, state):
+        self.ax = self.clear_axes()
+
+        # Avoid accidental binding and ensure we have a valid plot function
+        plot_func = self.PLOT_FUNC.__func__ if isinstance(self.PLOT_FUNC, staticmethod) else self.PLOT_FUNC
+        if plot_func is None:
+            return
+
+        plot_items = self.plot_items(state['plotted'])
+        for data, name in plot_items:
+            # Call fretbursts.dplot for each item in data_to_plot
+            fretbursts.dplot(data, plot_func, ax=self.ax, **state['plot_kwargs'])
             if self.ax.lines:
                 self.ax.lines[-1].set_label(name)
 
         # Add legend if multiple files are plotted
-        if len(self.data_to_plot) > 1:
+        if len(plot_items) > 1:
             self.ax.legend()
             self.ax.set_title('')
         
-        self.plot_widget.canvas.draw()
-    def export(self, export_type = 'file'):
-        data_dict = {}
-
-        for line in self.ax.get_lines():
-            label = line.get_label()
-            x_data = line.get_xdata()
-            y_data = line.get_ydata()
-
-            data_dict[f"{label}, X"] = x_data
-            data_dict[f"{label}, Y"] = y_data
-
-        df = pd.DataFrame(data_dict)
+    def bursts_dataframe(self) -> pd.DataFrame:
+        """Burst tables of the plotted files, one row per burst"""
+        frames = []
+        for cur_data, prefix in self.plotted:
+            tables = cur_data.burst_tables()
+            name = self.legend_label(cur_data, prefix, tables)
+            for ich, table in enumerate(tables):
+                frame = burst_table.to_dataframe(table)
+                frame.insert(0, 'file', name)
+                if len(tables) > 1:
+                    frame['spot'] = ich
+                frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def export(self, export_type = 'file', content = 'plot'):
+        if content == 'bursts':
+            df = self.bursts_dataframe()
+        else:
+            data_dict = {}
+
+            # the render thread may be redrawing the axes
+            with self.plot_widget.canvas.figure_lock:
+                lines = self.ax.get_lines() if self.ax is not None else []
+                for line in lines:
+                    label = line.get_label()
+                    x_data = line.get_xdata()
+                    y_data = line.get_ydata()
+
+                    data_dict[f"{label}, X"] = x_data
+                    data_dict[f"{label}, Y"] = y_data
+
+            df = pd.DataFrame(data_dict)
+            if not df.empty:
+                df.set_index(df.columns[0], inplace=True)
         if not df.empty:
-            df.set_index(df.columns[0], inplace=True)
             if export_type == 'file':
                     # Open file save dialog
                     from Qt.QtWidgets import QApplication
@@ -723,7 +910,91 @@ class BaseMultiFilePlotterNode(AbstractContentNode):
                                 f"Failed to save CSV file:\n{str(e)}"
                             )
             else:
-                df.to_clipboard()
+                df.to_clipboard(index=content != 'bursts')
+
+
+def dplot_title(fbsdata: FBSData, num_bursts: int) -> str:
+    """Axes title of `fretbursts.dplot` for the data of `fbsdata` with
+    `num_bursts` bursts"""
+    data = fbsdata.source_data
+    title = fbsdata.name
+    if 'bg_mean' in data:
+        title += (' BG=%.1fk' % (data.bg_mean[Ph_sel('all')][0] * 1e-3))
+    if 'T' in data:
+        title += (u', T=%dμs' % (data.T[0] * 1e6))
+    return title + (', #bu=%d' % num_bursts)
+
+
+class BaseHistogramPlotterNode(BaseMultiFilePlotterNode):
+    """Histogram of the burst table column `COLUMN`, one line per file,
+    drawn like the fretbursts histogram `PLOT_FUNC`.
+
+    The values of every file are sorted once (`misc.histograms`), a new
+    bin width only recounts the bins from them, so the bin width slider
+    stays interactive with many files. The selected Data is not built.
+    """
+    NODE_NAME = 'BaseHistogramPlotterNode'
+    COLUMN = None
+    XLABEL = None
+    XLIM = None
+    YSCALE = 'linear'
+    LINE_STYLE = dict(marker='o')
+
+    def __init__(self, widget_name='plot_widget', qgraphics_item=None):
+        super().__init__(widget_name, qgraphics_item)
+        self.sorted_values = histograms.SortedValuesCache(self.COLUMN)
+        self.__lines = []
+
+    @abstractmethod
+    def bins(self) -> np.ndarray:
+        """Bin edges of the histogram, from `PLOT_KWARGS`, on the GUI thread"""
+        pass
+
+    def plot_item(self, cur_data: FBSData, name: str):
+        table = cur_data.burst_tables()[0]
+        return (table, name, dplot_title(cur_data, len(table)))
+
+    def prepare_refresh(self):
+        state = super().prepare_refresh()
+        state['bin_edges'] = self.bins()
+        return state
+
+    def _on_refresh_canvas(self, state):
+        plot_items, bin_edges = self.plot_items(state['plotted']), state['bin_edges']
+        # only used here, on the render thread
+        histograms = self.sorted_values.update([table for table, _, _ in plot_items])
+        names = [name for _, name, _ in plot_items]
+        if names and [line.get_label() for line in self.__lines] == names \
+                and self.ax in self.plot_widget.figure.axes \
+                and set(self.__lines) <= set(self.ax.lines):
+            # same files: move the lines to the new bins, the axes,
+            # legend and lines are not rebuilt
+            for line, values in zip(self.__lines, histograms):
+                line.set_data(*values.histogram(bin_edges))
+            if len(plot_items) == 1:
+                self.ax.set_title(plot_items[0][2], fontsize=12)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            return
+
+        self.ax = self.clear_axes()
+        self.ax.grid(True)
+        self.ax.set_axisbelow(True)
+        self.__lines = []
+        for (_, name, title), values in zip(plot_items, histograms):
+            self.ax.set_title(title, fontsize=12)
+            self.__lines += self.ax.plot(*values.histogram(bin_edges), label=name, **self.LINE_STYLE)
+        self.ax.set_xlabel(self.XLABEL)
+        self.ax.set_ylabel('PDF')
+        self.ax.set_yscale(self.YSCALE)
+        if self.XLIM is not None:
+            self.ax.set_xlim(*self.XLIM)
+
+        # Add legend if multiple files are plotted
+        if len(plot_items) > 1:
+            self.ax.legend()
+            self.ax.set_title('')
+
 
 class BGFitPlotterNode(BaseSingleFilePlotterNode):
     NODE_NAME = 'Background Fit'
@@ -740,34 +1011,38 @@ class BGTimeLinePlotterNode(BaseSingleFilePlotterNode):
     def __init__(self, widget_name='plot_widget', qgraphics_item=None, inport_color=(255,255,0), enable_multiports=False):
         super().__init__(widget_name, qgraphics_item, inport_color, enable_multiports=enable_multiports)
 
-class ScatterWidthSizePlotterNode(BaseSingleFilePlotterNode):
+class ScatterWidthSizePlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'Burst Width vs Size'
     PLOT_FUNC = staticmethod(fretbursts.scatter_width_size)
 
-class ScatterDaPlotterNode(BaseSingleFilePlotterNode):
+class ScatterDaPlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'B.Donor vs Acc Size'
     PLOT_FUNC = staticmethod(fretbursts.scatter_da)
 
-class ScatterRateDaPlotterNode(BaseSingleFilePlotterNode):
+class ScatterRateDaPlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'B.Donor vs Acc Rate'
     PLOT_FUNC = staticmethod(fretbursts.scatter_rate_da)
 
-class ScatterFretSizePlotterNode(BaseSingleFilePlotterNode):
+class ScatterFretSizePlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'Burst FRET vs Size'
     PLOT_FUNC = staticmethod(fretbursts.scatter_fret_size)
 
-class ScatterFretNdNaPlotterNode(BaseSingleFilePlotterNode):
+class ScatterFretNdNaPlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'B. FRET vs Corr.Size'
     PLOT_FUNC = staticmethod(fretbursts.scatter_fret_nd_na)
 
-class ScatterFretWidthPlotterNode(BaseSingleFilePlotterNode):
+class ScatterFretWidthPlotterNode(BaseScatterPlotterNode):
     NODE_NAME = 'Burst FRET vs Width'
     PLOT_FUNC = staticmethod(fretbursts.scatter_fret_width)
        
     
-class EHistPlotterNode(BaseMultiFilePlotterNode):
+class EHistPlotterNode(BaseHistogramPlotterNode):
     NODE_NAME = 'FRET histogram'
     PLOT_FUNC = staticmethod(fretbursts.hist_fret)
+    COLUMN = 'E'
+    XLABEL = 'E'
+    XLIM = (-0.19, 1.19)
+    LINE_STYLE = dict(linestyle='-', marker='o', markersize=6, linewidth=2, alpha=0.6)
     def __init__(self, widget_name='plot_widget', qgraphics_item=None):
         # tell the base which widget name to resize
         super().__init__(widget_name, qgraphics_item)        
@@ -775,20 +1050,28 @@ class EHistPlotterNode(BaseMultiFilePlotterNode):
         self.PLOT_KWARGS['hist_style'] = 'line'
     def update_plot_kwargs(self):
         self.PLOT_KWARGS['binwidth'] = self.BinWidth_slider.get_value()        
+    def bins(self):
+        return np.arange(-0.2, 1.2, self.PLOT_KWARGS['binwidth'])
 
 class HistBurstSizeAllPlotterNode(BaseSingleFilePlotterNode):
     NODE_NAME = 'Burst Size hist.'
     PLOT_FUNC = staticmethod(fretbursts.hist_size_all)
 
-class HistBurstWidthPlotterNode(BaseMultiFilePlotterNode):
+class HistBurstWidthPlotterNode(BaseHistogramPlotterNode):
     NODE_NAME = 'Burst Width hist'
     PLOT_FUNC = staticmethod(fretbursts.hist_width)
+    COLUMN = 'width_ms'
+    XLABEL = 'Burst width (ms)'
+    XLIM = (0, None)
+    YSCALE = 'log'
     def __init__(self, widget_name='plot_widget', qgraphics_item=None):
         # tell the base which widget name to resize
         super().__init__(widget_name, qgraphics_item)        
         self.BinWidth_slider = self.node_builder.build_float_slider('Bin Width, ms', [0.01, 3, 0.1], 0.5)
     def update_plot_kwargs(self):
         self.PLOT_KWARGS['bins'] = (0, 15, self.BinWidth_slider.get_value() )   
+    def bins(self):
+        return np.arange(*self.PLOT_KWARGS['bins'])
 
 
 class HistBurstBrightnessPlotterNode(BaseMultiFilePlotterNode):
@@ -817,6 +1100,7 @@ class BVAPlotterNode(AbstractContentNode):
     PLOT_NODE = True
     MIN_WIDTH = 450
     MIN_HEIGHT = 300
+    RENDER_MODES = ['Density', 'KDE']
 
     def __init__(self, widget_name='plot_widget', qgraphics_item=None):
         super().__init__(widget_name, qgraphics_item)
@@ -831,90 +1115,54 @@ class BVAPlotterNode(AbstractContentNode):
             value=None,
             tooltip="Select an option"
         )
-
-    def _on_refresh_canvas(self):
-        plot_widget = self.get_widget('plot_widget').plot_widget
-        fig = plot_widget.figure
-        fig.clear()
-        ax = fig.add_subplot()
-
+        self.render_box = self.node_builder.build_combobox(
+            'Render',
+            self.RENDER_MODES,
+            'Density',
+            tooltip='KDE: seaborn Gaussian KDE, slow for many bursts. Density: FFT-smoothed 2D histogram')
+
+    def prepare_refresh(self):
+        state = super().prepare_refresh()
         map_name_to_data = {}
         self.data_to_plot.sort(key = lambda x: x.id)
         for cur_data in self.data_to_plot:
-            fname = os.path.basename(cur_data.data.fname)
+            fname = os.path.basename(cur_data.fname)
             fbid = cur_data.id
-            map_name_to_data[f'{fbid}, {fname}'] = cur_data.data
+            map_name_to_data[f'{fbid}, {fname}'] = cur_data
 
         self.items_to_plot.set_items(list(map_name_to_data.keys()))
         selected_val = self.items_to_plot.get_value()
-        selected_data = map_name_to_data.get(selected_val)
+        state['selected_data'] = map_name_to_data.get(selected_val)
+        state['render_mode'] = self.render_box.get_value()
+        return state
+
+    def _on_refresh_canvas(self, state):
+        ax = self.clear_axes()
+        selected = state['selected_data']
+        selected_data = selected.data if selected is not None else None
 
         if selected_data is None or not isinstance(selected_data, Data):
-            plot_widget.canvas.draw()
             return
-        def bva_sigma_E(n, bursts, DexAem_mask, out=None):
-            """
-            Perform BVA analysis computing std.dev. of E for sub-bursts in each burst.
-            
-            Split each burst in n-photons chunks (sub-bursts), compute E for each sub-burst,
-            then compute std.dev. of E across the sub-bursts.
-
-            For details on BVA see:
-
-            - Torella et al. (2011) Biophys. J. doi.org/10.1016/j.bpj.2011.01.066
-            - Ingargiola et al. (2016) bioRxiv, doi.org/10.1101/039198
-
-            Arguments:
-                n (int): number of photons in each sub-burst
-                bursts (Bursts object): burst-data object with indexes relative 
-                    to the Dex photon stream.
-                DexAem_mask (bool array): mask of A-emitted photons during D-excitation 
-                    periods. It is a boolean array indexing the array of Dex timestamps 
-                    (`Ph_sel(Dex='DAem')`).
-                out (None or list): append the result to the passed list. If None,
-                    creates a new list. This is useful to accumulate data from
-                    different spots in a single list.
-
-            Returns:
-                E_sub_std (1D array): contains for each burst, the standard deviation of 
-                sub-bursts FRET efficiency. Same length of input argument `bursts`.
-            """
-            E_sub_std = [] if out is None else out
-            
-            for burst in bursts:
-                E_sub_bursts = []
-                startlist = range(burst.istart, burst.istop + 2 - n, n)
-                stoplist = [i + n for i in startlist]
-                for start, stop in zip(startlist, stoplist):
-                    A_D = DexAem_mask[start:stop].sum()
-                    assert stop - start == n
-                    E = A_D / n
-                    E_sub_bursts.append(E)
-                E_sub_std.append(np.std(E_sub_bursts))
-                
-            return E_sub_std
         ds_FRET = selected_data
-        ph_d = ds_FRET.get_ph_times(ph_sel=fretbursts.Ph_sel(Dex='DAem'))
-        bursts = ds_FRET.mburst[0]
-        bursts_d = bursts.recompute_index_reduce(ph_d)
-        Dex_mask = ds_FRET.get_ph_mask(ph_sel=fretbursts.Ph_sel(Dex='DAem'))   
-        DexAem_mask = ds_FRET.get_ph_mask(ph_sel=fretbursts.Ph_sel(Dex='Aem')) 
-        DexAem_mask_d = DexAem_mask[Dex_mask]
-        n = 7
-        E_sub_std = bva_sigma_E(n, bursts_d, DexAem_mask_d)
+        n = ds_FRET.get('bva_n', bva.DEFAULT_N)
+        E_sub_std = bva.stored_bva_data(ds_FRET)
 
         x = np.arange(0,1.01,0.01)
         y = np.sqrt((x*(1-x))/n)
         ax.plot(x, y, lw=2, color='k', ls='--')
-        im = sns.kdeplot(data={'E':ds_FRET.E[0], 'sigma':np.asfarray(E_sub_std)}, x='E', y='sigma', 
-                        fill=True, cmap='Spectral_r', thresh=0.05, levels=20)
+        ylim = (0, np.sqrt(0.5**2/n)*2)
+        if state['render_mode'] == 'KDE':
+            sns.kdeplot(data={'E':ds_FRET.E[0], 'sigma':E_sub_std[0]}, x='E', y='sigma', 
+                        fill=True, cmap='Spectral_r', thresh=0.05, levels=20, ax=ax)
+        else:
+            plot_density(ax, ds_FRET.E[0], E_sub_std[0], extent=(0, 1, *ylim), 
+                         cmap='Spectral_r', thresh=0.05)
         ax.set_xlim(0,1)
-        ax.set_ylim(0,np.sqrt(0.5**2/7)*2)
+        ax.set_ylim(*ylim)
         ax.set_xlabel('E', fontsize=16)
         ax.set_ylabel(r'$\sigma_i$', fontsize=16);
         
         # fig.tight_layout()
-        plot_widget.canvas.draw()    
         
         
         
@@ -1,12 +1,170 @@
-from Qt import QtWidgets
+from Qt import QtWidgets, QtGui, QtCore
+from Qt.QtCore import Signal, QRunnable, QThreadPool
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
+from matplotlib.backends.backend_agg import RendererAgg
 import matplotlib.pyplot as plt
 from NodeGraphQt import NodeBaseWidget
 import matplotlib
 matplotlib.rcParams['figure.dpi'] = 96
 matplotlib.rcParams['savefig.dpi'] = 96
+import numpy as np
 import os
+import threading
+import time
+import traceback
+
+
+# all figures are built and rasterized on this single thread: matplotlib
+# keeps some global state, so two figures are never drawn at the same time
+RENDER_POOL = QThreadPool()
+RENDER_POOL.setMaxThreadCount(1)
+
+
+class _RenderJob(QRunnable):
+    def __init__(self, canvas):
+        super().__init__()
+        self.canvas = canvas
+
+    def run(self):
+        self.canvas.render_now()
+
+
+class AsyncFigureCanvas(FigureCanvas):
+    """Qt canvas that draws its figure on the render thread.
+
+    `draw` (and so `draw_idle`, used by zoom, pan and resizing) only queues
+    a render. The figure is rasterized into an off-screen Agg buffer on
+    `RENDER_POOL`, and the finished image is blitted in `paintEvent`, the
+    GUI thread never waits for matplotlib. Requests made while a render is
+    queued are merged into it.
+
+    `render_async(build)` also runs `build`, which (re)creates the figure
+    content, on the render thread right before rasterizing; only the last
+    build requested before the render starts is run. Mouse events
+    are ignored while it runs. Anything else touching the figure from
+    another thread must hold `figure_lock`: mouse, key and resize events
+    are handled under it here, the toolbar views in `NavigationToolbar`.
+    """
+    rendered = Signal(float)
+    image_ready = Signal(object)
+
+    def __init__(self, figure=None):
+        super().__init__(figure)
+        self.figure_lock = threading.RLock()
+        self.__lock = threading.Lock()
+        self.__build = None
+        self.__queued = False
+        self.__building = False
+        self.__image = None
+        self.image_ready.connect(self.__on_image_ready)
+
+    def draw(self):
+        self.render_async()
+
+    def render_async(self, build=None):
+        with self.__lock:
+            if build is not None:
+                self.__build = build
+            if self.__queued:
+                return
+            self.__queued = True
+        RENDER_POOL.start(_RenderJob(self))
+
+    def render_now(self):
+        """Run the pending builds and rasterize, on the calling thread"""
+        with self.__lock:
+            build, self.__build = self.__build, None
+            self.__queued = False
+        start = time.perf_counter()
+        with self.figure_lock:
+            try:
+                if build is not None:
+                    self.__building = True
+                    build()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.__building = False
+            width, height = self.get_width_height(physical=True)
+            if width <= 0 or height <= 0:
+                return
+            renderer = RendererAgg(width, height, self.figure.dpi)
+            try:
+                self.figure.draw(renderer)
+            except Exception:
+                traceback.print_exc()
+        image = np.asarray(renderer.buffer_rgba())
+        try:
+            self.image_ready.emit(image)
+            self.rendered.emit(time.perf_counter() - start)
+        except RuntimeError:
+            pass  # the widget was deleted meanwhile
+
+    def __on_image_ready(self, image):
+        self.__image = image
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        try:
+            painter.eraseRect(event.rect())
+            image = self.__image
+            if image is not None:
+                qimage = QtGui.QImage(memoryview(image), image.shape[1], image.shape[0],
+                                      QtGui.QImage.Format.Format_RGBA8888)
+                qimage.setDevicePixelRatio(self.device_pixel_ratio)
+                painter.drawImage(QtCore.QPoint(0, 0), qimage)
+            self._draw_rect_callback(painter)
+        finally:
+            painter.end()
+
+    def __handle(self, handler, event):
+        # zoom and pan change the axes: wait for a rasterization, but drop
+        # the event during a build, it replaces the axes
+        if self.__building:
+            return
+        with self.figure_lock:
+            handler(event)
+
+    def mousePressEvent(self, event):
+        self.__handle(super().mousePressEvent, event)
+
+    def mouseDoubleClickEvent(self, event):
+        self.__handle(super().mouseDoubleClickEvent, event)
+
+    def mouseMoveEvent(self, event):
+        self.__handle(super().mouseMoveEvent, event)
+
+    def mouseReleaseEvent(self, event):
+        self.__handle(super().mouseReleaseEvent, event)
+
+    def wheelEvent(self, event):
+        self.__handle(super().wheelEvent, event)
+
+    def keyPressEvent(self, event):
+        self.__handle(super().keyPressEvent, event)
+
+    def keyReleaseEvent(self, event):
+        self.__handle(super().keyReleaseEvent, event)
+
+    def resizeEvent(self, event):
+        with self.figure_lock:
+            super().resizeEvent(event)
+
+
+class NavigationToolbar(NavigationToolbar2QT):
+    """matplotlib toolbar that changes the views of the axes under the
+    canvas `figure_lock` (home, back, forward), never while the render
+    thread draws the figure"""
+
+    def _update_view(self):
+        with self.canvas.figure_lock:
+            super()._update_view()
+
+    def push_current(self):
+        with self.canvas.figure_lock:
+            super().push_current()
 
 
 class TemplatePlotWidget(QtWidgets.QWidget):
@@ -29,7 +187,7 @@ class TemplatePlotWidget(QtWidgets.QWidget):
         else:
             self.figure = plt.figure(facecolor=highlightColor)
             
-        self.canvas = FigureCanvas(self.figure)
+        self.canvas = AsyncFigureCanvas(self.figure)
         self.toolbar = NavigationToolbar(self.canvas, self)
         
         # Method 1: Try to find save action by iterating actions
@@ -141,7 +299,8 @@ class TemplatePlotWidget(QtWidgets.QWidget):
         # Save the figure if a filename was provided
         if filename:
             try:
-                self.figure.savefig(filename)
+                with self.canvas.figure_lock:
+                    self.figure.savefig(filename)
                 print("DEBUG: Figure saved successfully")
             except Exception as e:
                 print(f"DEBUG: Exception saving figure: {e}")
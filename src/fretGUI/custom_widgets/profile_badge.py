@@ -0,0 +1,99 @@
+from Qt.QtCore import QObject, QTimer
+from Qt.QtGui import QBrush, QColor, QPen
+from Qt.QtWidgets import QGraphicsRectItem, QGraphicsSimpleTextItem
+from singletons import NodeProfiler
+
+
+def heat_color(fraction: float) -> QColor:
+    """Green (0) to yellow to red (1)"""
+    fraction = min(max(fraction, 0.0), 1.0)
+    return QColor.fromHsvF((1.0 - fraction) / 3.0, 0.8, 0.9)
+
+
+def format_bytes(nbytes: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+class ProfileBadge(QGraphicsRectItem):
+    """Time of a node in the last run, drawn above the node"""
+    PADDING = 3
+
+    def __init__(self, node_view):
+        super().__init__(node_view)
+        self.text = QGraphicsSimpleTextItem(self)
+        self.text.setBrush(QBrush(QColor(20, 20, 20)))
+        self.setPen(QPen(QColor(20, 20, 20, 120)))
+        self.setZValue(node_view.zValue() + 1)
+
+    def set_totals(self, totals: dict, fraction: float):
+        lines = []
+        if totals['count']:
+            hits = totals['hit'] + totals['disk']
+            cached = hits + totals['miss']
+            cache = f", cache {hits}/{cached}" if cached else ''
+            lines.append(f"{totals['wall'] * 1e3:.1f} ms (CPU {totals['cpu'] * 1e3:.1f}), "
+                         f"{totals['count']} runs{cache}")
+            lines.append(f"data {format_bytes(totals['dataset_bytes'])}, "
+                         f"new {format_bytes(totals['allocated_bytes'])}")
+        if totals['redraw'] is not None:
+            lines.append(f"redraw {totals['redraw'] * 1e3:.1f} ms")
+        self.text.setText('\n'.join(lines))
+        self.setBrush(QBrush(heat_color(fraction)))
+        rect = self.text.boundingRect()
+        self.text.setPos(self.PADDING, self.PADDING)
+        self.setRect(0, 0, rect.width() + 2 * self.PADDING, rect.height() + 2 * self.PADDING)
+        self.setPos(0, -self.rect().height() - 4)
+
+
+class ProfilerOverlay(QObject):
+    """Heat-colored `ProfileBadge` on every profiled node of `graph`.
+
+    The color is the node time relative to the slowest node of the graph,
+    redraw time included. Badges are refreshed every `INTERVAL_MS` while
+    the overlay is shown.
+    """
+    INTERVAL_MS = 500
+
+    def __init__(self, graph, parent=None):
+        super().__init__(parent)
+        self.graph = graph
+        self.__badges = dict()
+        self.__timer = QTimer(self)
+        self.__timer.setInterval(self.INTERVAL_MS)
+        self.__timer.timeout.connect(self.refresh)
+
+    def show(self):
+        self.__timer.start()
+        self.refresh()
+
+    def hide(self):
+        self.__timer.stop()
+        for badge in self.__badges.values():
+            if badge.scene() is not None:
+                badge.scene().removeItem(badge)
+        self.__badges.clear()
+
+    def refresh(self):
+        profiler = NodeProfiler()
+        totals = dict()
+        for node in self.graph.all_nodes():
+            node_totals = profiler.node_totals(node)
+            if node_totals is not None:
+                totals[node] = node_totals
+        seconds = {node: node_totals['wall'] + (node_totals['redraw'] or 0.0)
+                   for node, node_totals in totals.items()}
+        slowest = max(seconds.values(), default=0.0) or 1.0
+        for node in list(self.__badges):
+            if node not in totals:
+                badge = self.__badges.pop(node)
+                if badge.scene() is not None:
+                    badge.scene().removeItem(badge)
+        for node, node_totals in totals.items():
+            badge = self.__badges.get(node)
+            if badge is None:
+                badge = self.__badges[node] = ProfileBadge(node.view)
+            badge.set_totals(node_totals, seconds[node] / slowest)
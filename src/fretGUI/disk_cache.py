@@ -0,0 +1,193 @@
+"""
+Second-tier, on-disk cache of node results.
+
+Entries are npz files named by the cache key of the result (see
+`FBSDataCash.make_hash`), so they stay valid across sessions as long as the
+file content and the parameters of all upstream nodes are the same. An
+entry holds every array of the result `Data` except the photon arrays it
+shares with the node input; these are taken from the input again when the
+entry is read. The object structure is pickled without arrays.
+
+Total size is capped, least recently used entries are removed first.
+"""
+import io
+import os
+import sys
+import pickle
+import threading
+import time
+
+import numpy as np
+import fretbursts
+from fretbursts.burstlib import Data
+
+
+def default_cache_dir() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'FretBurstStudio', f'fretbursts-{fretbursts.__version__}')
+
+
+def photon_refs(data: Data) -> dict:
+    """id(array) -> (field, channel) for the photon arrays of `data`"""
+    refs = dict()
+    for field in Data.ph_fields:
+        if data.get(field) is None:
+            continue
+        for ich, array in enumerate(data[field]):
+            if isinstance(array, np.ndarray):
+                refs[id(array)] = (field, ich)
+    return refs
+
+
+class _EntryPickler(pickle.Pickler):
+    def __init__(self, file, photons):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.photons = photons
+        self.arrays = dict()
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject:
+            return None
+        if id(obj) in self.photons:
+            return ('ph',) + self.photons[id(obj)]
+        name = f'a{len(self.arrays)}'
+        self.arrays[name] = obj
+        return ('npz', name)
+
+
+class _EntryUnpickler(pickle.Unpickler):
+    def __init__(self, file, npz, source):
+        super().__init__(file)
+        self.npz = npz
+        self.source = source
+
+    def persistent_load(self, pid):
+        if pid[0] == 'ph':
+            _, field, ich = pid
+            return self.source[field][ich]
+        return self.npz[pid[1]]
+
+
+class DiskCache:
+    DEFAULT_MAX_BYTES = 2 * 1024**3
+
+    def __init__(self, directory: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory if directory else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.__lock = threading.Lock()
+        self.__index = None  # key -> (mtime, size)
+
+    def __path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def __load_index(self):
+        if self.__index is not None:
+            return
+        self.__index = dict()
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                self.__index[entry.name[:-4]] = (stat.st_mtime, stat.st_size)
+
+    @property
+    def nbytes(self):
+        with self.__lock:
+            self.__load_index()
+            return sum(size for _, size in self.__index.values())
+
+    def get(self, key: str, source: Data):
+        """Read entry `key`, photon arrays are taken from `source`.
+
+        Returns None if there is no such entry or it can not be read.
+        """
+        if not self.enabled:
+            return None
+        path = self.__path(key)
+        with self.__lock:
+            self.__load_index()
+            if key not in self.__index:
+                return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            skeleton = arrays.pop('skeleton').tobytes()
+            data = _EntryUnpickler(io.BytesIO(skeleton), arrays, source).load()
+            os.utime(path)
+        except Exception as error:
+            print(f'disk cache: dropping unreadable entry {key}: {error!r}')
+            self.remove(key)
+            return None
+        with self.__lock:
+            if key in self.__index:
+                self.__index[key] = (time.time(), self.__index[key][1])
+        return data
+
+    def put(self, key: str, data: Data, source: Data):
+        """Write `data`, the output of a node for input `source`"""
+        if not self.enabled:
+            return
+        buffer = io.BytesIO()
+        pickler = _EntryPickler(buffer, photon_refs(source))
+        pickler.dump(data)
+        skeleton = np.frombuffer(buffer.getvalue(), dtype=np.uint8)
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.__path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, skeleton=skeleton, **pickler.arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        stat = os.stat(path)
+        with self.__lock:
+            self.__load_index()
+            self.__index[key] = (stat.st_mtime, stat.st_size)
+            self.__cleanup()
+
+    def remove(self, key: str):
+        with self.__lock:
+            self.__load_index()
+            self.__index.pop(key, None)
+        try:
+            os.remove(self.__path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.__lock:
+            self.__load_index()
+            keys = list(self.__index)
+        for key in keys:
+            self.remove(key)
+
+    def set_max_bytes(self, max_bytes: int):
+        with self.__lock:
+            self.max_bytes = max_bytes
+            self.__load_index()
+            self.__cleanup()
+
+    def __cleanup(self):
+        total = sum(size for _, size in self.__index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (_, size) in sorted(self.__index.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.__path(key))
+            except OSError:
+                pass
+            self.__index.pop(key)
+            total -= size
@@ -1,6 +1,11 @@
 from fretbursts.burstlib import Data
-from copy import deepcopy
+import hashlib
+import os
+import threading
+import numpy as np
 from singletons import FBSDataIDGenerator
+import operations
+from misc import burst_table
 
 
 class FBSData():
@@ -10,7 +15,21 @@ class FBSData():
         self.__id = id if id else FBSDataIDGenerator().get_next_id()
         self.__checked = checked
         self.__node_metadata = node_metadata if node_metadata else []
-        self.prev_nodeid = None        
+        self.prev_nodeid = None
+        # content address of `data`: file fingerprint + chain of node parameters
+        self.cache_key = None
+        # pending correction factors of the data, see `correct`
+        self.__corrections = None
+        self.__corrected = None
+        self.__corrected_lock = threading.Lock()
+        # pending burst selection of the data, see `select`
+        self.__masks = None
+        self.__selections = []
+        self.__selected = None
+        self.__selected_tables = None
+        self.__selected_lock = threading.Lock()
+        # called with this object when pending data is built, see `on_materialize`
+        self.__on_materialize = None
         
     def add_node_metadata(self, metadata: dict):
         self.__node_metadata.append(metadata)
@@ -32,14 +51,163 @@ class FBSData():
     @path.setter
     def path(self, new_path):
         self.__path =  new_path
+
+    @property
+    def fname(self) -> str:
+        """File the data was loaded from, read without building the data"""
+        fname = self.__path or self.__data.get('fname', '')
+        return fname if isinstance(fname, str) else fname[0]
+
+    @property
+    def name(self) -> str:
+        """Measurement name as `Data.name` (last subfolder and file name
+        without extension), read without building the data"""
+        basename = os.path.splitext(os.path.basename(self.fname))[0]
+        last_dir = os.path.basename(os.path.dirname(self.fname))
+        return '_'.join([last_dir, basename]) if last_dir else basename
         
     @property
     def data(self):
-        return self.__data
+        """The Data, with the pending corrections and burst selection
+        applied on first access"""
+        base = self.base_data
+        if self.__masks is None:
+            return base
+        with self.__selected_lock:
+            built = self.__selected is None
+            if built:
+                selected = base.select_bursts_mask_apply(self.__masks, computefret=True)
+                selected.s = list(base.s) + self.__selections
+                self.__selected = selected
+            selected = self.__selected
+        if built:
+            self.__materialized()
+        return selected
     
     @data.setter
     def data(self, new_data):
         self.__data = new_data
+        self.__corrections = None
+        self.__corrected = None
+        self.__masks = None
+        self.__selections = []
+        self.__selected = None
+        self.__selected_tables = None
+
+    @property
+    def base_data(self):
+        """The Data with the pending corrections, before the pending burst
+        selection, never filtered"""
+        if self.__corrections is None:
+            return self.__data
+        with self.__corrected_lock:
+            built = self.__corrected is None
+            if built:
+                self.__corrected = operations.apply_corrections(self.__data, **self.__corrections)
+            corrected = self.__corrected
+        if built:
+            self.__materialized()
+        return corrected
+
+    @property
+    def source_data(self):
+        """The Data the pending corrections and selection apply to"""
+        return self.__data
+
+    @property
+    def corrections(self):
+        """Pending correction factors (gamma, leakage, dir_ex), None if
+        there are none"""
+        return self.__corrections
+
+    @property
+    def burst_masks(self):
+        """Per-channel boolean masks of the pending selection over the bursts
+        of `base_data`, None if there is none"""
+        return self.__masks
+
+    def select(self, masks: list, str_sel: str = ''):
+        """New FBSData with the bursts of `masks` selected, lazily.
+
+        `masks` are per-channel boolean arrays over the bursts of
+        `base_data`, combined with the pending selection of this object.
+        Nothing is copied: the selected Data is built when `data` is first
+        read, so a chain of selectors filters the bursts once.
+        """
+        if self.__masks is not None:
+            masks = [np.logical_and(old, new) for old, new in zip(self.__masks, masks)]
+        new_obj = self.with_data(self.__data)
+        new_obj.__corrections = self.__corrections
+        new_obj.__corrected = self.__corrected
+        new_obj.__masks = list(masks)
+        new_obj.__selections = self.__selections + [str_sel]
+        return new_obj
+
+    def correct(self, corrections: dict):
+        """New FBSData with the correction factors `corrections` (gamma,
+        leakage, dir_ex), lazily.
+
+        The factors replace the pending ones. Nothing is copied: the
+        corrected counts, E and S are computed from the counts of the data
+        (`operations.apply_corrections`) when `base_data` is first read, so
+        a new gamma costs one pass over the bursts. A pending selection is
+        kept, the bursts are the same.
+        """
+        new_obj = self.with_data(self.__data)
+        new_obj.__corrections = dict(corrections)
+        new_obj.__masks = self.__masks
+        new_obj.__selections = self.__selections
+        return new_obj
+
+    def with_data_of(self, other: 'FBSData', cache_key: str = None):
+        """Like `with_data`, with the data and pending selection of `other`"""
+        new_obj = self.with_data(other.__data, cache_key)
+        new_obj.__corrections = other.__corrections
+        new_obj.__corrected = other.__corrected
+        new_obj.__masks = other.__masks
+        new_obj.__selections = other.__selections
+        new_obj.__selected = other.__selected
+        new_obj.__selected_tables = other.__selected_tables
+        return new_obj
+
+    def burst_tables(self) -> list:
+        """Per-channel burst tables of `data` (`misc.burst_table`).
+
+        With a pending selection they are the selected rows of the tables
+        of `base_data`, the selected Data is not built.
+        """
+        base = self.base_data
+        if self.__masks is None:
+            return burst_table.burst_tables(base)
+        with self.__selected_lock:
+            built = self.__selected_tables is None
+            if built:
+                self.__selected_tables = [
+                    table[mask] for table, mask in
+                    zip(burst_table.burst_tables(base), self.__masks)]
+            tables = self.__selected_tables
+        if built:
+            self.__materialized()
+        return tables
+
+    def on_materialize(self, callback):
+        """Call `callback(self)` each time pending data is built, e.g. by the
+        cache holding this object to account for the memory"""
+        self.__on_materialize = callback
+
+    def materialized(self) -> list:
+        """Objects built so far for the pending corrections and selection
+        (corrected Data, selected Data and burst tables)"""
+        return [obj for obj in (self.__corrected, self.__selected, self.__selected_tables)
+                if obj is not None]
+
+    def __materialized(self):
+        # outside of the locks, the callback may read this object
+        if self.__on_materialize is not None:
+            self.__on_materialize(self)
+
+    def has_bursts(self) -> bool:
+        return burst_table.has_bursts(self.__data)
     
     @property
     def id(self):
@@ -47,14 +215,60 @@ class FBSData():
         return self.__id
         
     def copy(self):
-        new_obj = FBSData(deepcopy(self.__data),
+        """Copy-on-write copy of this object.
+
+        Per-photon arrays (`Data.ph_fields`: ph_times_m, A_em, D_em, ...) are
+        shared with the original, everything else (bursts, background,
+        corrections, metadata) is deep-copied, so the copy can be mutated by
+        a node without touching the original. Nodes must never modify photon
+        arrays in place; replace them instead. Pending corrections and burst
+        selection are applied to the copy.
+        """
+        new_obj = FBSData(FBSData.cow_copy(self.data),
                           self.__path,
                           id=self.__id,
                           checked=self.__checked,
                           node_metadata=self.node_metadata,
                           )
         new_obj.prev_nodeid = self.prev_nodeid
+        new_obj.cache_key = self.cache_key
+        return new_obj
+
+    def with_data(self, data: Data, cache_key: str = None):
+        """New FBSData with the id, path and state of this one holding `data`.
+
+        `data` is not copied, it must not be modified afterwards.
+        """
+        new_obj = FBSData(data,
+                          self.__path,
+                          id=self.__id,
+                          checked=self.__checked,
+                          node_metadata=self.node_metadata,
+                          )
+        new_obj.cache_key = cache_key
         return new_obj
+
+    @staticmethod
+    def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+        """SHA-256 of the size, modification time and inode of the file and
+        of its first and last `chunk_size` bytes.
+
+        The file is not read whole: memory-mapped loading would be paged in
+        only to compute the key.
+        """
+        stat = os.stat(path)
+        sha = hashlib.sha256(f'{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}'.encode())
+        with open(path, 'rb') as f:
+            sha.update(f.read(chunk_size))
+            if stat.st_size > chunk_size:
+                f.seek(max(chunk_size, stat.st_size - chunk_size))
+                sha.update(f.read(chunk_size))
+        return sha.hexdigest()
+    
+    @staticmethod
+    def cow_copy(data: Data) -> Data:
+        """Deep copy of `data` that shares per-photon arrays with the original"""
+        return operations.cow_copy(data)
     
     def __repr__(self):
         return f"fbs_data at {id(self)}, inner at {id(self.__data)}"
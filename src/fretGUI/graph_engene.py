@@ -1,34 +1,97 @@
 from NodeGraphQt import NodeGraph
+from Qt.QtCore import QThreadPool
+from node_workers import NodeWorker, WorkerFlow
+from singletons import ThreadSignalManager, NodeProfiler, GraphTopology
+from run_token import RunToken
         
 
 class GraphEngene:
     def __init__(self, graph: NodeGraph):
         self.graph = graph    
+        self.__token = None
+        # start nodes of the runs not finished yet, None for a whole graph run
+        self.__pending = []
+        ThreadSignalManager().all_thread_finished.connect(self.on_all_finished)
         
     def find_root_nodes(self):
         """Find nodes that have no input connections"""
-        root_nodes = []
-        for node in self.graph.all_nodes():
-            has_inputs = False
-            for port in node.input_ports():
-                if port.connected_ports():
-                    has_inputs = True
-                    break
-            if not has_inputs:
-                root_nodes.append(node)
-        return root_nodes
+        return GraphTopology().roots(self.graph.all_nodes())
     
     def find_leafs(self):
-        leafs = []
+        return GraphTopology().leaves(self.graph.all_nodes())
+            
+    
+    def run_all(self):
+        """Rerun the whole graph from the root nodes, older runs are cancelled"""
+        token = self.__supersede()
+        self.__pending = None
         for node in self.graph.all_nodes():
-            for port in node.output_ports():
-                if port.connected_ports():
-                    break
-            else:
-                print(f"leave found {node}")
-                leafs.append(node)
-        return leafs
+            node.invalidate()
+        pool = QThreadPool.globalInstance()
+        # the datasets in flight are bounded over all the loaders of the run
+        slots = NodeWorker.new_slots()
+        for root_node in self.find_root_nodes():
+            pool.start(NodeWorker(root_node, token=token, slots=slots))
             
+    def run_from(self, node):
+        """Rerun `node` and its descendants only.
+
+        They are marked dirty and fed again with the outputs kept by their
+        clean parents from the last run, nothing above `node` is executed.
+        Older runs are cancelled; the nodes they did not finish are rerun
+        together with `node`. Falls back to `run_all` if some of the clean
+        parents were never run.
+        """
+        if self.__pending is None:
+            return self.run_all()
+        all_nodes = set(self.graph.all_nodes())
+        starts = [start for start in dict.fromkeys(self.__pending + [node]) 
+                  if start in all_nodes]
+        dirty_set = set(dirty_node for start in starts 
+                        for dirty_node in [start] + list(start.bfs()))
+        dirty = [dirty_node for dirty_node in GraphTopology().topological_order(self.graph.all_nodes())
+                 if dirty_node in dirty_set]
+        frontier = []
+        for dirty_node in dirty:
+            for parent in dict.fromkeys(dirty_node.iter_parent_nodes()):
+                if parent in dirty_set:
+                    continue
+                if parent.last_outputs is None:
+                    return self.run_all()
+                frontier.append((parent, dirty_node))
+
+        token = self.__supersede()
+        self.__pending = starts
+        for dirty_node in dirty:
+            dirty_node.invalidate()
+        pool = QThreadPool.globalInstance()
+        slots = NodeWorker.new_slots()
+        started = False
+        for start in starts:
+            if start.is_root():
+                pool.start(NodeWorker(start, token=token, slots=slots))
+                started = True
+        for parent, dirty_node in frontier:
+            nsteps = len(list(dirty_node.bfs())) + 1
+            for fbsdata in list(parent.last_outputs.values()):
+                fbsdata.prev_nodeid = id(parent)
+                flow = WorkerFlow(nsteps)
+                flow.add_task()
+                pool.start(NodeWorker(dirty_node, fbsdata, flow, token, slots))
+                started = True
+        if not started:
+            # nothing to compute, dirty plotters still have to be cleared
+            ThreadSignalManager().all_thread_finished.emit()
+            
+    def __supersede(self) -> RunToken:
+        if self.__token is not None:
+            self.__token.cancel()
+        self.__token = RunToken()
+        NodeProfiler().new_run()
+        return self.__token
+    
+    def on_all_finished(self):
+        self.__pending = []
     
     def make_nodes_static(self):
         for node in self.graph.all_nodes():
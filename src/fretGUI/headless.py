@@ -0,0 +1,309 @@
+"""
+Headless runs of saved sessions, without Qt.
+
+A session file saved by the GUI is rebuilt as a `Pipeline` of node types
+and widget values, and the files of a batch go through it in a pool of
+worker processes, one file per process, so a batch uses all the cores of
+a server without a display. The steps are the ones of the GUI nodes
+(`operations`); plot nodes are skipped. The burst data of the last
+analysis node of every branch is written as CSV, one table per file,
+and a summary of every file (burst counts, mean E and S, background
+rates) is collected in a single CSV or Parquet table:
+
+    python src/fretGUI/headless.py configs/lsm510_basic.json DATA_DIR --pattern '*.001' -o results
+
+Only the summary rows travel back from the workers, so the batch size is
+not limited by memory.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from fretbursts import Ph_sel
+from fretbursts import burstlib_ext as bext
+from fretbursts.burstlib import Data
+
+import operations
+from misc import burst_table
+
+
+class PipelineNode:
+    def __init__(self, id: str, type_: str, name: str, params: dict):
+        self.id = id
+        self.type_ = type_
+        self.name = name
+        self.params = params
+        self.parents = []
+        self.children = []
+
+    def is_loader(self) -> bool:
+        return self.type_ in operations.LOADERS
+
+    def is_step(self) -> bool:
+        return self.type_ in operations.OPERATIONS
+
+    def __repr__(self):
+        return f"PipelineNode({self.name!r}, {self.type_})"
+
+
+class Pipeline:
+    """Loader and analysis nodes of a session, connected as in the graph"""
+
+    def __init__(self, nodes: list):
+        self.nodes = {node.id: node for node in nodes}
+
+    @classmethod
+    def from_session(cls, path: str) -> 'Pipeline':
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, session: dict) -> 'Pipeline':
+        nodes = {}
+        for node_id, node_data in session.get('nodes', {}).items():
+            node = PipelineNode(node_id, node_data['type_'], node_data.get('name', node_id),
+                                node_data.get('custom', {}))
+            if node.is_loader() or node.is_step():
+                nodes[node_id] = node
+            elif node.type_.startswith('Analysis.') or node.type_.startswith('Selectors.'):
+                raise ValueError(f"{node.name}: no headless step for {node.type_}")
+        for connection in session.get('connections', []):
+            parent, child = nodes.get(connection['out'][0]), nodes.get(connection['in'][0])
+            if parent is None or child is None:
+                continue
+            if parent not in child.parents:
+                child.parents.append(parent)
+                parent.children.append(child)
+        for node in nodes.values():
+            if len(node.parents) > 1:
+                raise ValueError(f"{node.name}: analysis nodes have a single input")
+        return cls(list(nodes.values()))
+
+    def loaders(self) -> list:
+        return [node for node in self.nodes.values() if node.is_loader()]
+
+    def find_loader(self, name: str = None) -> PipelineNode:
+        """The loader node called `name`, or the only loader of the session"""
+        loaders = self.loaders()
+        if not loaders:
+            raise ValueError("the session has no loader")
+        if name is not None:
+            loaders = [node for node in loaders if node.name == name]
+        if len(loaders) != 1:
+            names = ', '.join(repr(node.name) for node in self.loaders())
+            raise ValueError(f"choose one of the loaders {names}" if name is None
+                             else f"no loader {name!r}, the session has {names}")
+        return loaders[0]
+
+    def branch(self, loader: PipelineNode) -> list:
+        """Nodes fed by `loader`, parents before children"""
+        order = []
+        q = deque([loader])
+        while q:
+            node = q.popleft()
+            order.append(node)
+            q.extend(node.children)
+        return order
+
+    def outputs(self, loader: PipelineNode) -> list:
+        """Last analysis node of every branch of `loader`"""
+        return [node for node in self.branch(loader)
+                if node.is_step() and not node.children]
+
+    def run(self, path: str, loader: PipelineNode) -> dict:
+        """Run the branch of `loader` on the file `path`, results by node id.
+
+        The results of the nodes with several children are copied before
+        every child but the last, steps modify their input in place.
+        """
+        results = {}
+        for node in self.branch(loader):
+            if node is loader:
+                results[node.id] = operations.load(node.type_, path, node.params)
+                continue
+            parent = node.parents[0]
+            data = results[parent.id]
+            if node is not parent.children[-1]:
+                data = operations.cow_copy(data)
+            results[node.id] = operations.run(node.type_, data, node.params)
+        return results
+
+
+def burst_table_path(out_dir: str, path: str, node: PipelineNode) -> str:
+    name = node.name.replace(os.sep, '_')
+    return os.path.join(out_dir, f"{os.path.basename(path)}.{name}.csv")
+
+
+# background rates of the summary table, for the photon streams found in the data
+BG_RATES = [('bg_all_cps', Ph_sel('all')), ('bg_dd_cps', Ph_sel(Dex='Dem')),
+            ('bg_ad_cps', Ph_sel(Dex='Aem')), ('bg_aa_cps', Ph_sel(Aex='Aem'))]
+
+
+def burst_summary(data: Data) -> dict:
+    """Summary metrics of `data`, all channels together"""
+    row = dict(num_bursts=0, E_mean=np.nan, S_mean=np.nan,
+               size_mean=np.nan, width_ms_mean=np.nan)
+    if 'mburst' in data and sum(data.num_bursts) > 0:
+        bursts = np.concatenate(burst_table.burst_tables(data))
+        row['num_bursts'] = len(bursts)
+        row['E_mean'] = float(np.nanmean(bursts['E']))
+        if 'S' in bursts.dtype.names:
+            row['S_mean'] = float(np.nanmean(bursts['S']))
+        row['size_mean'] = float(np.mean(bursts['nt']))
+        row['width_ms_mean'] = float(np.mean(bursts['width']) * data.clk_p * 1e3)
+    bg_mean = data.bg_mean if 'bg' in data else {}
+    for name, ph_sel in BG_RATES:
+        if ph_sel in bg_mean:
+            row[name] = float(np.mean(bg_mean[ph_sel]))
+    return row
+
+
+def run_file(pipeline: Pipeline, loader_id: str, path: str, out_dir: str = None) -> dict:
+    """Worker process job: run one file, return its summary rows.
+
+    The burst tables are written in `out_dir`, if given.
+    """
+    t0 = time.perf_counter()
+    loader = pipeline.nodes[loader_id]
+    results = pipeline.run(path, loader)
+    rows = []
+    for node in pipeline.outputs(loader):
+        data = results[node.id]
+        row = dict(file=path, node=node.name, **burst_summary(data))
+        rows.append(row)
+        if out_dir is not None and row['num_bursts'] > 0:
+            bext.burst_data(data).to_csv(burst_table_path(out_dir, path, node), index=False)
+    return dict(path=path, seconds=time.perf_counter() - t0, rows=rows)
+
+
+def find_files(inputs: list, pattern: str = '*') -> list:
+    """Files given in `inputs`, expanding glob patterns, and the ones
+    matching `pattern` in the directories of `inputs`"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(os.path.join(item, name) for name in sorted(os.listdir(item))
+                         if fnmatch.fnmatch(name, pattern)
+                         and os.path.isfile(os.path.join(item, name)))
+        elif glob.has_magic(item):
+            files.extend(path for path in sorted(glob.glob(item)) if os.path.isfile(path))
+        else:
+            files.append(item)
+    return files
+
+
+def run_batch(pipeline: Pipeline, files: list, out_dir: str = None,
+              loader: PipelineNode = None, workers: int = None, abort=None):
+    """Run `files` through `pipeline` on `workers` processes (all cores by
+    default). Yields (path, result, error) as the files are done.
+
+    At most `workers` files are submitted at a time, the next one when a
+    result was taken, so a consumer that stops iterating stops the batch
+    after the files in flight. `abort` is called before every submission;
+    when it raises, the files in flight are still yielded, then the
+    exception is raised again.
+    """
+    loader = loader or pipeline.find_loader()
+    workers = workers or os.cpu_count() or 1
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    files = iter(files)
+    aborted = []
+
+    def submit(pool, futures, count):
+        if aborted:
+            return
+        for path in islice(files, count):
+            try:
+                if abort is not None:
+                    abort()
+            except Exception as error:
+                aborted.append(error)
+                return
+            futures[pool.submit(run_file, pipeline, loader.id, path, out_dir)] = path
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = dict()
+        submit(pool, futures, workers)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                submit(pool, futures, 1)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    yield path, None, error
+                else:
+                    yield path, result, None
+    if aborted:
+        raise aborted[0]
+
+
+def write_table(rows: list, path: str) -> str:
+    """Write summary rows as Parquet if `path` ends with .parquet, else as
+    CSV. Without a Parquet engine (pyarrow or fastparquet) the table is
+    written as CSV next to `path`. Returns the path written."""
+    table = pd.DataFrame(rows)
+    if path.endswith('.parquet'):
+        try:
+            table.to_parquet(path, index=False)
+            return path
+        except ImportError as error:
+            print(f"{error}, writing CSV instead", file=sys.stderr)
+            path = path[:-len('.parquet')] + '.csv'
+    table.to_csv(path, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('session', help='session file saved by the GUI')
+    parser.add_argument('inputs', nargs='+', help='data files or directories')
+    parser.add_argument('--pattern', default='*', help='files to run in the directories')
+    parser.add_argument('--loader', default=None,
+                        help='name of the loader node, needed if the session has several')
+    parser.add_argument('-o', '--out', default='results', help='output directory')
+    parser.add_argument('--table', default='summary.csv',
+                        help='summary table in the output directory, .csv or .parquet')
+    parser.add_argument('--no-bursts', action='store_true',
+                        help='write only the summary table, no burst tables')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes, all cores by default')
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline.from_session(args.session)
+    loader = pipeline.find_loader(args.loader)
+    files = find_files(args.inputs, args.pattern)
+    print(f"{len(files)} files through {len(pipeline.branch(loader))} nodes "
+          f"from {loader.name!r}")
+    failed = 0
+    rows = []
+    t0 = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    out_dir = None if args.no_bursts else args.out
+    for path, result, error in run_batch(pipeline, files, out_dir, loader, args.workers):
+        if error is not None:
+            failed += 1
+            rows.append(dict(file=path, error=repr(error)))
+            print(f"FAILED {path}: {error!r}", file=sys.stderr)
+        else:
+            rows.extend(result['rows'])
+            bursts = ', '.join(f"{row['node']}: {row['num_bursts']}" for row in result['rows'])
+            print(f"{path}: {result['seconds']:.1f} s, bursts {bursts}")
+    table_path = write_table(rows, os.path.join(args.out, args.table))
+    print(f"done in {time.perf_counter() - t0:.1f} s, {failed} failed, summary in {table_path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
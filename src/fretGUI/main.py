@@ -2,6 +2,7 @@
 import sys
 import os, json
 import signal
+import multiprocessing
 from pathlib import Path
 from Qt import QtWidgets, QtCore, QtGui
 import NodeGraphQt
@@ -76,10 +77,13 @@ def main():
     import custom_nodes.selector_nodes as selector_nodes
     import graph_engene
     from custom_widgets.toogle_widget import IconToggleButton
-    from singletons import ThreadSignalManager, NodeStateManager
+    from singletons import ThreadSignalManager, NodeStateManager, ExecutionBackend, FBSDataCash, NodeProfiler
+    from custom_widgets.profile_badge import ProfilerOverlay
     from custom_widgets.progressbar_widget import ProgressBar, ProgressBar2
     from custom_nodes.custom_nodes import PhHDF5Node
-    from node_workers import NodeWorker
+    from node_workers import NodeWorker, BatchWorker
+    import headless
+    from run_token import RunToken
     from Qt.QtCore import QThreadPool
     from NodeGraphQt import NodeGraph, NodesPaletteWidget, constants
     from NodeGraphQt import PropertiesBinWidget
@@ -169,6 +173,7 @@ def main():
 
             custom_nodes.BurstSearchNodeRate,            
             custom_nodes.FuseBurstsNode,
+            custom_nodes.BVANode,
             custom_nodes.DitherNode,
             # custom_nodes.AlexNode,
 
@@ -217,16 +222,16 @@ def main():
     app.processEvents()
     
     # Define helper functions that are needed for the UI
+    # one engine for the session, it keeps track of the runs in flight
+    engene = graph_engene.GraphEngene(graph)
+    
     def on_run_btn_clicked(graph, btn):
-        engene = graph_engene.GraphEngene(graph)
-        roots = engene.find_root_nodes()
-        pool = QThreadPool.globalInstance()
-        for root_node in roots:
-            new_worker = NodeWorker(root_node)
-            pool.start(new_worker)
+        engene.run_all()
+        
+    def on_node_changed(graph, node):
+        engene.run_from(node)
     
     def on_toogle_clicked(graph, toggle_btn):
-        engene = graph_engene.GraphEngene(graph)
         toggle_state = toggle_btn.isChecked()
         if not toggle_state:
             print('static')
@@ -264,6 +269,7 @@ def main():
             """)
     ThreadSignalManager().run_btn_clicked.connect(lambda: on_run_btn_clicked(graph, run_button))
     run_button.clicked.connect(ThreadSignalManager().run_btn_clicked.emit)
+    ThreadSignalManager().node_changed.connect(lambda node: on_node_changed(graph, node))
     
     toggle_btn = IconToggleButton(parent=graph_widget)
     toggle_btn.toggled.connect(lambda: on_toogle_clicked(graph, toggle_btn))   
@@ -416,9 +422,22 @@ def main():
         result = original_load_session(file_path)
         for node in graph.all_nodes():
             restore_resizable_node_sizes(node, saved_sizes)
+        set_execution_backend(data.get('execution_backend', 'threads'))
         return result
     graph.load_session = load_session_wrapper
 
+    original_save_session = graph.save_session
+    def save_session_wrapper(file_path):
+        result = original_save_session(file_path)
+        # keep the execution backend with the session
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        data['execution_backend'] = ExecutionBackend().mode
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=2, separators=(',', ':'))
+        return result
+    graph.save_session = save_session_wrapper
+
 
 
     def apply_theme(kind=None):
@@ -566,11 +585,112 @@ def main():
             graph.load_session(template_path)
             apply_theme()
 
+    def set_cache_budget():
+        cache = FBSDataCash()
+        value, ok = QtWidgets.QInputDialog.getInt(
+            graph_widget, "Cache memory budget", "Memory budget, MB:",
+            cache.max_bytes // 1024**2, 0, 1024**2, 256)
+        if ok:
+            cache.set_max_bytes(value * 1024**2)
+
+    def set_disk_cache_budget():
+        disk = FBSDataCash().disk
+        value, ok = QtWidgets.QInputDialog.getInt(
+            graph_widget, "Disk cache size", f"Size of {disk.directory}, MB:",
+            disk.max_bytes // 1024**2, 0, 1024**3, 256)
+        if ok:
+            disk.set_max_bytes(value * 1024**2)
+
+    def show_cache_stats():
+        stats = FBSDataCash().stats()
+        QtWidgets.QMessageBox.information(
+            graph_widget, "Cache",
+            f"Entries: {stats['entries']}<br>"
+            f"Memory: {stats['nbytes'] / 1024**2:.1f} of {stats['max_bytes'] / 1024**2:.0f} MB<br>"
+            f"Hits: {stats['hits']}<br>Misses: {stats['misses']}<br>"
+            f"Evictions: {stats['evictions']}<br><br>"
+            f"Disk: {stats['disk_nbytes'] / 1024**2:.1f} of {stats['disk_max_bytes'] / 1024**2:.0f} MB<br>"
+            f"Disk hits: {stats['disk_hits']}")
+
+    # progress dialog of the batch run in progress, one at a time
+    batch_dialogs = []
+
+    def run_batch():
+        """Run the files chosen by the user through the current graph, without
+        showing them in the graph, and write a per-file summary table."""
+        if batch_dialogs:
+            batch_dialogs[0].show()
+            return
+        files, _ = QtWidgets.QFileDialog.getOpenFileNames(graph_widget, "Batch run: data files")
+        if not files:
+            return
+        table_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            graph_widget, "Batch run: summary table", filter="CSV (*.csv);;Parquet (*.parquet)")
+        if not table_path:
+            return
+        loader_names = [node.name() for node in graph.selected_nodes()
+                        if isinstance(node, custom_nodes.AbstractLoader)]
+        try:
+            pipeline = headless.Pipeline.from_dict(graph.serialize_session())
+            loader = pipeline.find_loader(loader_names[0] if len(loader_names) == 1 else None)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(graph_widget, "Batch run",
+                                          f"{error}<br><br>Select the loader node to run.")
+            return
+        token = RunToken()
+        progress = QtWidgets.QProgressDialog(f"Batch run of {len(files)} files", "Stop",
+                                             0, len(files), graph_widget)
+        progress.setWindowModality(QtCore.Qt.NonModal)
+        progress.canceled.connect(token.cancel)
+        batch_progress = ThreadSignalManager().batch_progress
+        batch_finished = ThreadSignalManager().batch_finished
+
+        def on_progress(done, total):
+            progress.setValue(done)
+
+        def on_finished(message):
+            batch_progress.disconnect(on_progress)
+            batch_finished.disconnect(on_finished)
+            batch_dialogs.clear()
+            progress.close()
+            QtWidgets.QMessageBox.information(graph_widget, "Batch run", message)
+
+        batch_progress.connect(on_progress)
+        batch_finished.connect(on_finished)
+        batch_dialogs.append(progress)
+        progress.show()
+        QThreadPool.globalInstance().start(BatchWorker(pipeline, loader, files, table_path, token))
+
+    profiler_overlay = ProfilerOverlay(graph, graph_widget)
+
+    def set_profiling(enabled):
+        NodeProfiler().enabled = enabled
+        if enabled:
+            profiler_overlay.show()
+        else:
+            profiler_overlay.hide()
+
+    def clear_profile():
+        NodeProfiler().clear()
+        profiler_overlay.refresh()
+
+    def export_trace():
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            graph_widget, "Export trace", "trace.json", filter="Chrome trace (*.json)")
+        if path:
+            NodeProfiler().export_chrome_trace(path)
+
+    def set_execution_backend(mode):
+        ExecutionBackend().set_mode(mode)
+        backend_actions[mode].setChecked(True)
+
     menu_bar = QtWidgets.QMenuBar(graph_widget)
     file_menu = menu_bar.addMenu("File")
     file_menu.addAction("Open").triggered.connect(open_file)
     file_menu.addAction("Save").triggered.connect(save_file)
     file_menu.addSeparator()
+    file_menu.addAction("Batch run...").triggered.connect(run_batch)
+    file_menu.addSeparator()
     file_menu.addAction("Close").triggered.connect(close_app)
 
     theme_menu = menu_bar.addMenu("Theme")
@@ -593,6 +713,39 @@ def main():
         no_templates_action = templates_menu.addAction("Configs folder not found")
         no_templates_action.setEnabled(False)
 
+    backend_menu = menu_bar.addMenu("Backend")
+    backend_group = QtWidgets.QActionGroup(backend_menu)
+    backend_actions = dict()
+    for mode, label in [('threads', 'Threads'), ('processes', 'Processes')]:
+        action = backend_menu.addAction(label)
+        action.setCheckable(True)
+        action.setChecked(ExecutionBackend().mode == mode)
+        action.setToolTip('Run background, burst search and fusion on worker processes'
+                          if mode == 'processes' else 'Run all nodes on threads of the GUI process')
+        action.triggered.connect(lambda checked, mode=mode: set_execution_backend(mode))
+        backend_group.addAction(action)
+        backend_actions[mode] = action
+
+    cache_menu = menu_bar.addMenu("Cache")
+    cache_menu.addAction("Memory budget...").triggered.connect(set_cache_budget)
+    cache_menu.addAction("Statistics").triggered.connect(show_cache_stats)
+    cache_menu.addAction("Clear").triggered.connect(lambda: FBSDataCash().clear())
+    cache_menu.addSeparator()
+    disk_cache_action = cache_menu.addAction("Use disk cache")
+    disk_cache_action.setCheckable(True)
+    disk_cache_action.setChecked(FBSDataCash().disk.enabled)
+    disk_cache_action.toggled.connect(lambda checked: setattr(FBSDataCash().disk, 'enabled', checked))
+    cache_menu.addAction("Disk cache size...").triggered.connect(set_disk_cache_budget)
+    cache_menu.addAction("Clear disk cache").triggered.connect(lambda: FBSDataCash().disk.clear())
+
+    profiler_menu = menu_bar.addMenu("Profiler")
+    profiler_action = profiler_menu.addAction("Profile nodes")
+    profiler_action.setCheckable(True)
+    profiler_action.setToolTip('Time every node, file and redraw, shown above the nodes')
+    profiler_action.toggled.connect(set_profiling)
+    profiler_menu.addAction("Export trace...").triggered.connect(export_trace)
+    profiler_menu.addAction("Clear").triggered.connect(clear_profile)
+
     log_menu = menu_bar.addMenu("Log")
     log_menu.addAction("Show Console").triggered.connect(toggle_log_window)
     
@@ -607,6 +760,8 @@ def main():
     
 
 if __name__ == '__main__':
+    # worker processes of the process backend in frozen builds
+    multiprocessing.freeze_support()
     main()
     
 
@@ -132,6 +132,8 @@ def disable_legend_toggle(ax, connection_id_attr='_legend_toggle_cid'):
         return True
     return False
 
-from .plot_utils import enable_legend_toggle, disable_legend_toggle
+from .plot_utils import (enable_legend_toggle, disable_legend_toggle,
+                         plot_density, replace_markers_with_density)
 
-__all__ = ['enable_legend_toggle', 'disable_legend_toggle']
+__all__ = ['enable_legend_toggle', 'disable_legend_toggle',
+           'plot_density', 'replace_markers_with_density']
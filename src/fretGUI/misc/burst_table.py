@@ -0,0 +1,225 @@
+"""
+Columnar table of the burst features of a Data object.
+
+`burst_table(data, ich)` is a NumPy structured array with one row per
+burst of channel `ich`: start, stop and width, background period, raw and
+corrected counts, size, brightness, FRET efficiency and stoichiometry,
+background counts, and the peak rate and signal to background ratio when
+they were computed. It is built once per Data and reused by every reader
+(selectors, plots, export) until the bursts or their corrections change:
+the table is dropped with the Data, and rebuilt when one of the arrays it
+was computed from is replaced (a new burst search, `calc_fret`, ...).
+
+Selections of `fretbursts.select_bursts` that only compare burst features
+to thresholds are available as `selection_masks`, computed on the table
+columns with the same arithmetic as fretbursts, so the masks are equal.
+
+This module must not import Qt, it is used by headless worker processes.
+"""
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+from fretbursts import Ph_sel
+from fretbursts.burstlib import Data
+
+# id(Data) -> (weak reference to the Data, clk_p, source objects, per-channel tables)
+_TABLES = {}
+# reentrant: a garbage collection in the locked sections may drop a Data
+_TABLES_LOCK = threading.RLock()
+
+# fields the table is computed from, see `_sources`
+_SOURCE_FIELDS = ('mburst', 'bp', 'nd', 'na', 'naa', 'nt', 'E', 'S',
+                  'max_rate', 'sbr', 'bg')
+
+
+def has_bursts(data: Data) -> bool:
+    return isinstance(data, Data) and 'mburst' in data
+
+
+def _sources(data: Data) -> tuple:
+    """The objects the table of `data` is computed from.
+
+    fretbursts replaces these lists when it recomputes them (corrections
+    call `calc_fret`, which adds new E and S lists), so a replaced object
+    means a stale table. The entry holds them: an id alone could be
+    reused by a new list once the old one is freed.
+    """
+    sources = []
+    for field in _SOURCE_FIELDS:
+        value = data.get(field)
+        sources.append(value)
+        if isinstance(value, list):
+            sources.extend(value)
+    return tuple(sources)
+
+
+def _same_sources(old: tuple, new: tuple) -> bool:
+    return len(old) == len(new) and all(a is b for a, b in zip(old, new))
+
+
+def compute_burst_table(data: Data, ich: int = 0) -> np.ndarray:
+    """Burst features of channel `ich` of `data`, one row per burst"""
+    bursts = data.mburst[ich]
+    period = np.asarray(data.bp[ich], dtype=np.int64)
+    width = np.asarray(bursts.width, dtype=np.int64)
+    width_s = width * data.clk_p
+    # burst size and brightness as in fretbursts.select_bursts (gamma = 1)
+    size = data.nd[ich] * 1.0 + data.na[ich]
+    columns = dict(
+        t_start=bursts.start * data.clk_p,
+        t_stop=bursts.stop * data.clk_p,
+        width=width,
+        width_ms=width_s * 1e3,
+        bg_period=period,
+        size_raw=np.asarray(bursts.counts, dtype=np.int64),
+        nd=data.nd[ich],
+        na=data.na[ich],
+    )
+    if 'naa' in data:
+        columns['naa'] = data.naa[ich]
+    columns.update(nt=data.nt[ich], size=size, brightness=size / width_s, E=data.E[ich])
+    if 'S' in data:
+        columns['S'] = data.S[ich]
+    # background counts in the bursts, as in fretbursts.select_bursts.nd_bg/na_bg
+    columns['bg_dd'] = data.bg[Ph_sel(Dex='Dem')][ich][period] * width * data.clk_p
+    columns['bg_ad'] = data.bg[Ph_sel(Dex='Aem')][ich][period] * width * data.clk_p
+    for field in ('max_rate', 'sbr'):
+        if field in data:
+            columns[field] = data[field][ich]
+
+    table = np.empty(len(width), dtype=[(name, np.asarray(values).dtype)
+                                        for name, values in columns.items()])
+    for name, values in columns.items():
+        table[name] = values
+    return table
+
+
+def _lookup(data: Data):
+    with _TABLES_LOCK:
+        entry = _TABLES.get(id(data))
+    if (entry is None or entry[0]() is not data or entry[1] != data.clk_p
+            or not _same_sources(entry[2], _sources(data))):
+        return None
+    return entry[3]
+
+
+def _store(data: Data, tables: list):
+    key = id(data)
+
+    def forget(_, key=key):
+        with _TABLES_LOCK:
+            entry = _TABLES.get(key)
+            if entry is not None and entry[0]() is None:
+                del _TABLES[key]
+
+    with _TABLES_LOCK:
+        _TABLES[key] = (weakref.ref(data, forget), data.clk_p, _sources(data), tables)
+
+
+def burst_tables(data: Data) -> list:
+    """Per-channel burst tables of `data`, computed on first use"""
+    tables = _lookup(data)
+    if tables is None:
+        tables = [compute_burst_table(data, ich) for ich in range(data.nch)]
+        _store(data, tables)
+    return tables
+
+
+def burst_table(data: Data, ich: int = 0) -> np.ndarray:
+    """Burst table of channel `ich` of `data`, computed on first use"""
+    return burst_tables(data)[ich]
+
+
+def to_dataframe(table: np.ndarray):
+    """pandas DataFrame of a burst table, without the clock-unit width"""
+    return pd.DataFrame({name: table[name] for name in table.dtype.names
+                         if name != 'width'})
+
+
+def _between(values, th1, th2):
+    return (values >= th1) * (values <= th2)
+
+
+def _size(table, clk_p, th1=20, th2=np.inf):
+    assert th1 <= th2, 'th1 (%.2f) must be <= of th2 (%.2f)' % (th1, th2)
+    str_sel = "size_th%d" % th1
+    if th2 < np.inf:
+        str_sel += "_th2_%d" % th2
+    return _between(table['size'], th1, th2), str_sel + "Gd%.1f" % 1.0
+
+
+def _E(table, clk_p, E1=-np.inf, E2=np.inf):
+    assert E1 <= E2, 'Threshold E1 (%.2f) must be <= of E2 (%.2f)' % (E1, E2)
+    return _between(table['E'], E1, E2), ''
+
+
+def _brightness(table, clk_p, th1=0, th2=np.inf):
+    return _between(table['brightness'], th1, th2), ''
+
+
+def _count(column):
+    def select(table, clk_p, th1=20, th2=np.inf):
+        assert th1 <= th2, 'th1 (%.2f) must be <= of th2 (%.2f)' % (th1, th2)
+        return _between(table[column], th1, th2), ''
+    return select
+
+
+def _count_to_bg(column, bg_column):
+    def select(table, clk_p, F=5):
+        return table[column] >= F * table[bg_column], ''
+    return select
+
+
+def _peak_phrate(table, clk_p, th1=0, th2=np.inf):
+    return _between(table['max_rate'], th1, th2), ''
+
+
+def _period(table, clk_p, bp1=0, bp2=None):
+    if bp2 is None:
+        bp2 = table['bg_period'].max()
+    return _between(table['bg_period'], bp1, bp2), ''
+
+
+def _time(table, clk_p, time_s1=0, time_s2=None):
+    if time_s2 is None:
+        time_s2 = table['t_start'].max()
+    return _between(table['t_start'], time_s1, time_s2), ''
+
+
+def _width(table, clk_p, th1=0.5, th2=np.inf):
+    assert th1 <= th2, 'th1 (%.2f) must be <= of th2 (%.2f)' % (th1, th2)
+    return _between(table['width'], th1 * 1e-3 / clk_p, th2 * 1e-3 / clk_p), ''
+
+
+# fretbursts.select_bursts function name -> (selection on a table, columns it needs)
+SELECTIONS = {
+    'size': (_size, ('size',)),
+    'E': (_E, ('E',)),
+    'brightness': (_brightness, ('brightness',)),
+    'na': (_count('na'), ('na',)),
+    'na_bg': (_count_to_bg('na', 'bg_ad'), ('na', 'bg_ad')),
+    'nd': (_count('nd'), ('nd',)),
+    'nd_bg': (_count_to_bg('nd', 'bg_dd'), ('nd', 'bg_dd')),
+    'peak_phrate': (_peak_phrate, ('max_rate',)),
+    'period': (_period, ('bg_period',)),
+    'time': (_time, ('t_start',)),
+    'width': (_width, ('width',)),
+}
+
+
+def selection_masks(data: Data, select: str, **kwargs):
+    """Per-channel burst masks and selection string of the
+    `fretbursts.select_bursts` function named `select`, computed on the
+    burst tables of `data`.
+
+    Returns None if the tables lack a column the selection needs (e.g.
+    'max_rate' before `calc_max_rate`).
+    """
+    selection, needed = SELECTIONS[select]
+    tables = burst_tables(data)
+    if any(name not in tables[0].dtype.names for name in needed):
+        return None
+    results = [selection(table, data.clk_p, **kwargs) for table in tables]
+    return [mask for mask, _ in results], results[0][1]
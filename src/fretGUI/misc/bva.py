@@ -0,0 +1,106 @@
+"""
+Burst Variance Analysis (BVA).
+
+Every burst is split in consecutive sub-bursts of `n` photons of the
+donor-excitation stream, the FRET efficiency of each sub-burst is the
+fraction of acceptor photons, and the standard deviation of these values
+is compared to the one expected from shot noise, sqrt(E (1 - E) / n).
+
+For details on BVA see:
+
+- Torella et al. (2011) Biophys. J. doi.org/10.1016/j.bpj.2011.01.066
+- Ingargiola et al. (2016) bioRxiv, doi.org/10.1101/039198
+
+The sub-burst counts are computed for all bursts at once from a cumulative
+sum of the acceptor mask, and the per-burst standard deviations with
+`np.add.reduceat`, there is no Python loop over bursts.
+"""
+import numpy as np
+import fretbursts
+from fretbursts.burstlib import Data
+
+DEFAULT_N = 7
+
+
+def bva_sigma_E(n: int, bursts, DexAem_mask: np.ndarray) -> np.ndarray:
+    """Standard deviation of the sub-burst FRET efficiency of every burst.
+
+    Arguments:
+        n (int): number of photons in each sub-burst
+        bursts (Bursts object): burst-data object with indexes relative
+            to the Dex photon stream.
+        DexAem_mask (bool array): mask of A-emitted photons during D-excitation
+            periods. It is a boolean array indexing the array of Dex timestamps
+            (`Ph_sel(Dex='DAem')`).
+
+    Returns:
+        E_sub_std (1D array): for each burst, the standard deviation of
+        sub-bursts FRET efficiency, NaN for bursts shorter than `n` photons.
+        Photons after the last complete sub-burst are not used.
+    """
+    istart = np.asarray(bursts.istart, dtype=np.int64)
+    istop = np.asarray(bursts.istop, dtype=np.int64)
+    E_sub_std = np.full(len(istart), np.nan)
+    nsub = (istop - istart + 1) // n
+    has_sub = nsub > 0
+    nsub = nsub[has_sub]
+    if len(nsub) == 0:
+        return E_sub_std
+
+    # index of the first sub-burst of every burst in the flat sub-burst arrays
+    first = np.cumsum(nsub) - nsub
+    rank = np.arange(nsub.sum()) - np.repeat(first, nsub)
+    sub_start = np.repeat(istart[has_sub], nsub) + n * rank
+
+    acceptor_cumsum = np.zeros(len(DexAem_mask) + 1, dtype=np.int64)
+    np.cumsum(DexAem_mask, out=acceptor_cumsum[1:])
+    E_sub = (acceptor_cumsum[sub_start + n] - acceptor_cumsum[sub_start]) / n
+
+    E_mean = np.add.reduceat(E_sub, first) / nsub
+    deviation = E_sub - np.repeat(E_mean, nsub)
+    E_sub_std[has_sub] = np.sqrt(np.add.reduceat(deviation**2, first) / nsub)
+    return E_sub_std
+
+
+def bva_data(data: Data, n: int = DEFAULT_N) -> list:
+    """`bva_sigma_E` of the bursts of `data`, one array per channel"""
+    E_sub_std = []
+    for ich, bursts in enumerate(data.mburst):
+        ph_d = data.get_ph_times(ich=ich, ph_sel=fretbursts.Ph_sel(Dex='DAem'))
+        bursts_d = bursts.recompute_index_reduce(ph_d)
+        Dex_mask = data.get_ph_mask(ich=ich, ph_sel=fretbursts.Ph_sel(Dex='DAem'))
+        DexAem_mask = data.get_ph_mask(ich=ich, ph_sel=fretbursts.Ph_sel(Dex='Aem'))
+        E_sub_std.append(bva_sigma_E(n, bursts_d, DexAem_mask[Dex_mask]))
+    return E_sub_std
+
+
+def bursts_key(data: Data) -> list:
+    """Per-channel (istart, istop) of the bursts of `data`, stored next to
+    `E_sub_std` to tell which bursts the values belong to"""
+    return [(np.array(bursts.istart), np.array(bursts.istop)) for bursts in data.mburst]
+
+
+def stored_bva_data(data: Data) -> list:
+    """`bva_data` of `data`, reusing the values stored by the BVA node.
+
+    The stored `E_sub_std` are not filtered by the burst selections after
+    the node: the values of the current bursts are looked up by their
+    start and stop (`bva_bursts`). If a burst is not found (new burst
+    search, fused bursts) everything is computed again.
+    """
+    n = data.get('bva_n', DEFAULT_N)
+    stored, stored_bursts = data.get('E_sub_std'), data.get('bva_bursts')
+    if stored is None or stored_bursts is None:
+        return bva_data(data, n)
+    E_sub_std = []
+    for values, (istart, istop), bursts in zip(stored, stored_bursts, data.mburst):
+        if bursts.num_bursts == 0:
+            E_sub_std.append(values[:0])
+            continue
+        # selections keep the bursts in order, istart is sorted
+        index = np.minimum(np.searchsorted(istart, bursts.istart), len(istart) - 1)
+        if (len(istart) == 0 or not np.array_equal(istart[index], bursts.istart)
+                or not np.array_equal(istop[index], bursts.istop)):
+            return bva_data(data, n)
+        E_sub_std.append(values[index])
+    return E_sub_std
@@ -440,6 +440,78 @@ class ConfoCor2Raw(object):
         else:
             return ch0, ch1
 
+    def photons(self, chunksize=1 << 22, abort=None):
+        """Return time-sorted events of both channels as one stream.
+
+        Equivalent to merging the two arrays returned by `asarray` and
+        sorting them by time, without the intermediate (N, 4) times and
+        (N, 8) event arrays. The file is memory-mapped and decoded in two
+        passes of `chunksize` data words: the first counts the events to
+        allocate the output, the second fills it.
+
+        Every data word holds a clock increment and an event byte. The word
+        spans 4 clock ticks, bits 2*k and 2*k+1 of the event byte are the
+        channel 0 and channel 1 events at tick k. Events are emitted in
+        tick order, channel 1 before channel 0 within one tick.
+
+        Parameters
+        ----------
+        chunksize : int (optional)
+            Number of data words decoded at once.
+        abort : callable (optional)
+            Called before every chunk of both passes. Raise from it to stop
+            decoding.
+
+        Returns
+        -------
+        times : ndarray
+            Event times in detector clock units, int64.
+        channel0 : ndarray
+            True for the events of channel 0, bool.
+
+        """
+        size = os.fstat(self._fh.fileno()).st_size - 30
+        nwords = size // 2
+        if nwords == 0:
+            return numpy.empty(0, 'i8'), numpy.empty(0, bool)
+        words = numpy.memmap(self._fh, dtype='u1', mode='r', offset=30,
+                             shape=(nwords, 2))
+        popcount = numpy.array([bin(i).count('1') for i in range(256)], 'u1')
+        total = 0
+        for start in range(0, nwords, chunksize):
+            if abort is not None:
+                abort()
+            total += int(popcount[words[start:start+chunksize, 1]].sum(
+                dtype='i8'))
+
+        times = numpy.empty(total, 'i8')
+        channel0 = numpy.empty(total, bool)
+        # swap the bits of every tick, channel 1 (odd bit) comes first
+        byte = numpy.arange(256, dtype='u1')
+        swapped = ((byte & 0x55) << 1) | ((byte & 0xAA) >> 1)
+        clock = 0
+        pos = 0
+        for start in range(0, nwords, chunksize):
+            if abort is not None:
+                abort()
+            chunk = numpy.array(words[start:start+chunksize])
+            # clock time of tick 0 of every word: increments plus 3 per word
+            base = numpy.cumsum(chunk[:, 0], dtype='i8')
+            base += clock
+            base += 3 * numpy.arange(start, start + len(chunk), dtype='i8')
+            clock = int(base[-1]) - 3 * (start + len(chunk) - 1)
+            word = numpy.flatnonzero(chunk[:, 1])
+            bits = numpy.unpackbits(swapped[chunk[word, 1]][:, None], axis=1,
+                                    bitorder='little')
+            index, column = numpy.divmod(numpy.flatnonzero(bits), 8)
+            del bits
+            nevents = len(index)
+            times[pos:pos+nevents] = base[word[index]] + column // 2
+            channel0[pos:pos+nevents] = column % 2 == 1
+            pos += nevents
+        del words
+        return times, channel0
+
     def __str__(self):
         """Return string with information about file."""
         return '\n'.join((
@@ -0,0 +1,124 @@
+"""
+Memory-mapped Photon-HDF5 loading through an uncompressed sidecar.
+
+Photon-HDF5 files are compressed, so they can not be memory-mapped. The
+first time a file is opened it is loaded with `fretbursts.loader` and every
+photon array (`Data.ph_fields`) is written to its own `.npy` file in a
+sidecar folder, next to a pickle of the rest of the `Data` object. The
+returned `Data`, and every later load of the same file, uses copy-on-write
+`np.memmap` arrays on the sidecar, so photons are paged in only when a
+node touches them and the OS can drop them again under memory pressure.
+
+A sidecar is identified by the absolute path, size and modification time
+of its source file. The total size of all sidecars is capped, the least
+recently used ones are removed first.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+import fretbursts
+from fretbursts.burstlib import Data
+
+from disk_cache import default_cache_dir
+
+SIDECAR_MAX_BYTES = 50 * 1024**3
+COMPLETE_MARK = 'complete'
+
+# converting loads the whole file in memory, do one file at a time
+_convert_lock = threading.Lock()
+
+
+def sidecar_root() -> str:
+    return os.path.join(default_cache_dir(), 'sidecars')
+
+
+def sidecar_dir(path: str) -> str:
+    stat = os.stat(path)
+    ident = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'
+    return os.path.join(sidecar_root(), hashlib.sha256(ident.encode()).hexdigest())
+
+
+class _SidecarPickler(pickle.Pickler):
+    def __init__(self, file, photons):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.photons = photons
+
+    def persistent_id(self, obj):
+        if isinstance(obj, np.ndarray):
+            return self.photons.get(id(obj))
+        return None
+
+
+class _SidecarUnpickler(pickle.Unpickler):
+    def __init__(self, file, directory):
+        super().__init__(file)
+        self.directory = directory
+
+    def persistent_load(self, name):
+        # copy-on-write: cython routines need writable buffers, the file is never modified
+        return np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='c')
+
+
+def _write(directory: str, data: Data):
+    tmp_dir = f'{directory}.{threading.get_ident()}.tmp'
+    os.makedirs(tmp_dir, exist_ok=True)
+    photons = dict()
+    for field in Data.ph_fields:
+        if data.get(field) is None:
+            continue
+        for ich, array in enumerate(data[field]):
+            if isinstance(array, np.ndarray) and not array.dtype.hasobject:
+                name = f'{field}_{ich}'
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+                photons[id(array)] = name
+    data.pop('data_file', None)  # open PyTables handle, if any
+    with open(os.path.join(tmp_dir, 'data.pickle'), 'wb') as f:
+        _SidecarPickler(f, photons).dump(data)
+    open(os.path.join(tmp_dir, COMPLETE_MARK), 'w').close()
+    if os.path.exists(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def _read(directory: str) -> Data:
+    with open(os.path.join(directory, 'data.pickle'), 'rb') as f:
+        data = _SidecarUnpickler(f, directory).load()
+    os.utime(os.path.join(directory, COMPLETE_MARK))
+    return data
+
+
+def _cleanup(keep: str):
+    root = sidecar_root()
+    entries = []
+    for entry in os.scandir(root):
+        mark = os.path.join(entry.path, COMPLETE_MARK)
+        if not entry.is_dir() or not os.path.exists(mark):
+            continue
+        size = sum(f.stat().st_size for f in os.scandir(entry.path))
+        entries.append((os.path.getmtime(mark), size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= SIDECAR_MAX_BYTES:
+            break
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def photon_hdf5_mmap(path: str, read=fretbursts.loader.photon_hdf5) -> Data:
+    """Same as `read(path)`, photon arrays are memory-mapped.
+
+    `read` loads the Photon-HDF5 file when there is no sidecar yet.
+    """
+    directory = sidecar_dir(path)
+    if os.path.exists(os.path.join(directory, COMPLETE_MARK)):
+        return _read(directory)
+    with _convert_lock:
+        if not os.path.exists(os.path.join(directory, COMPLETE_MARK)):
+            _write(directory, read(path))
+            _cleanup(keep=directory)
+    return _read(directory)
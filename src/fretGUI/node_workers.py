@@ -1,106 +1,230 @@
-
-from Qt.QtCore import QRunnable, QThreadPool
+from Qt.QtCore import QRunnable, QThreadPool, QMutex, QMutexLocker, QSemaphore
 import uuid
-from singletons import ThreadSignalManager
+from singletons import ThreadSignalManager, NodeProfiler
+from run_token import RunToken, RunCancelled
 from abc import abstractmethod
-from collections import deque
-from copy import deepcopy
+import headless
+
+
+
+class WorkerFlow:
+    """Progress bookkeeping for a group of worker tasks.
+
+    A flow is reported to the progress bar as one thread. Tasks are counted
+    when they are scheduled, not when they start, so a flow can not finish
+    while one of its tasks is still waiting in the thread pool.
+    """
+    def __init__(self, nsteps: int, on_finished=None):
+        self.uid = uuid.uuid4().hex
+        self.mutex = QMutex()
+        self.__pending = 0
+        self.__on_finished = on_finished
+        ThreadSignalManager().thread_started.emit(self.uid, nsteps)
+
+    def add_task(self):
+        with QMutexLocker(self.mutex):
+            self.__pending += 1
 
+    def step(self):
+        ThreadSignalManager().thread_progress.emit(self.uid)
+
+    def task_done(self):
+        with QMutexLocker(self.mutex):
+            self.__pending -= 1
+            finished = self.__pending == 0
+        if finished:
+            ThreadSignalManager().thread_finished.emit(self.uid)
+            if self.__on_finished is not None:
+                self.__on_finished()
 
 
 class AbstractNodeWorker(QRunnable):
-    def __init__(self, start_node, data=None, node_seq=None):
+    def __init__(self, start_node, data=None, flow=None, token=None, slots=None):
         super().__init__()
         self.start_node = start_node
         self.data = data
-        self.node_seq = node_seq if node_seq else deque()
-        self.uid = uuid.uuid4().hex
-        
-    @abstractmethod
-    def fill_nodeseq(self):
-        pass
-    
+        if flow is None:
+            flow = WorkerFlow(1)
+            flow.add_task()
+        self.flow = flow
+        self.token = token if token is not None else RunToken()
+        # datasets in flight of the run, shared by all its workers
+        self.slots = slots
+
     @abstractmethod
     def _run(self):
         pass
-    
-    @abstractmethod
-    def need_fill(self) -> bool:
-        pass
-    
 
     def run(self):
-        if self.need_fill():
-            self.fill_nodeseq()
-        ThreadSignalManager().thread_started.emit(self.uid, len(self.node_seq) - 1)
         try:
-            self._run()
-        except AttributeError as error:
-            ThreadSignalManager().thread_error.emit(self.uid)
+            with self.token.bind():
+                self._run()
+        except RunCancelled:
+            pass
+        except Exception as error:
+            ThreadSignalManager().thread_error.emit(self.flow.uid)
             raise error
         finally:
-            ThreadSignalManager().thread_finished.emit(self.uid)
-            
-    def run_in_new_thread(self, node, data, q, *args, **kwargs):
-        new_worker = type(self)(node, deepcopy(data), q, *args, **kwargs)
+            self.flow.task_done()
+
+    def run_in_new_thread(self, node, data, flow, *args, **kwargs):
+        flow.add_task()
+        self.start_in_new_thread(node, data, flow, *args, **kwargs)
+
+    @staticmethod
+    def acquire(semaphore: QSemaphore):
+        """Blocking acquire that gives the thread back to the pool while waiting"""
+        if semaphore.tryAcquire():
+            return
+        pool = QThreadPool.globalInstance()
+        pool.releaseThread()
+        try:
+            semaphore.acquire()
+        finally:
+            pool.reserveThread()
+
+    def start_in_new_thread(self, node, data, flow, *args, **kwargs):
+        """Same as `run_in_new_thread` for a task already added to `flow`"""
+        new_worker = type(self)(node, data, flow, self.token, *args, slots=self.slots, **kwargs)
         pool = QThreadPool.globalInstance()
         pool.start(new_worker)
 
 
-class NodeWorker(AbstractNodeWorker):    
-    def __init__(self, start_node, data=None, node_seq=None, need_fill=True):
-        super().__init__(start_node, data, node_seq)   
-        self.__need_fill = need_fill
-    
-    def need_fill(self):
-        return self.__need_fill
-        
+class NodeWorker(AbstractNodeWorker):
+    """Runs the graph below `start_node` once per dataset.
+
+    Every dataset returned by a node is passed by reference to each of its
+    children, so a node is executed once per input dataset no matter how
+    many leaves are below it, and is kept in `node.last_outputs` so a later run
+    can start in the middle of the graph. Nodes must not modify their input (see
+    `FBSDataCash.fbscash`). Children are started on the global thread pool
+    as soon as a dataset is returned, except for the last one, which
+    continues on the current thread. Every dataset produced by a root node
+    is reported as a separate flow, and at most `MAX_DATASETS_IN_FLIGHT` of
+    them are processed at once over all the roots of the run: the workers
+    of a run share one semaphore (`new_slots`), a root waits (and so does a
+    loader generator) until one of them is finished. Once the run token is
+    cancelled, workers stop before the next node and loaders stop pulling
+    new datasets.
+    """
+    MAX_DATASETS_IN_FLIGHT = max(2, QThreadPool.globalInstance().maxThreadCount())
+
+    @classmethod
+    def new_slots(cls) -> QSemaphore:
+        """Dataset slots of a new run, to pass to all of its workers"""
+        return QSemaphore(cls.MAX_DATASETS_IN_FLIGHT)
+
     def _run(self):
-        while len(self.node_seq) != 0:
-            ThreadSignalManager().thread_progress.emit(self.uid)
-            cur_node = self.node_seq.popleft()
+        if self.slots is None:
+            # a worker started alone is a run of its own
+            self.slots = self.new_slots()
+        slots = self.slots
+        node, data = self.start_node, self.data
+        while node is not None:
+            if self.token.is_cancelled():
+                return
+            self.flow.step()
             try:
-                data_container = cur_node.execute(self.data)
-            except AttributeError as error:
-                if self.data is None:
-                    continue
+                if data is None:
+                    # roots (loaders) are profiled per file in `load`
+                    data_container = node.execute(data)
                 else:
-                    raise error
-            except Exception as error:
+                    with NodeProfiler().span(node, data) as outputs:
+                        data_container = node.execute(data)
+                        outputs.extend(data_container)
+            except AttributeError as error:
+                if data is None:
+                    return
                 raise error
-            else:        
-                for i, cur_data in enumerate(data_container):
-                    
+
+            # outputs are kept for incremental reruns (see `GraphEngene.run_from`)
+            children = list(dict.fromkeys(node.iter_children_nodes()))
+            if len(children) == 0:
+                # leaves (plotters) return their input, which is shared
+                keep_outputs = len(node.output_ports()) != 0
+                for cur_data in data_container:
+                    if keep_outputs and cur_data is not None:
+                        node.store_output(cur_data)
+                return
+            # datasets can be yielded one by one (loaders), children of each
+            # one are started right away, only the last task stays on this thread
+            task = None
+            try:
+                for cur_data in data_container:
+                    if self.token.is_cancelled():
+                        if hasattr(data_container, 'close'):
+                            data_container.close()
+                        break
                     if cur_data is None:
-                        self.data = cur_data
                         continue
-                    
-                    cur_data.prev_nodeid = id(cur_node)
-                    if i >= 1:
-                        self.run_in_new_thread(cur_node, cur_data, self.node_seq.copy(), False)
-                    else:
-                        self.data = cur_data
-                    
-    def fill_nodeseq(self):
-        paths = []
-        self._fill_nodeseq(self.start_node, self.node_seq, paths)
-        
-        for i, cur_pathq in enumerate(paths):
-            if i == 0:
-                self.node_seq = cur_pathq
-                self.need_fill = False
-            else:
-                self.run_in_new_thread(self.start_node, self.data, cur_pathq, False)
-    
-    def _fill_nodeseq(self, node, visited, paths=[]):
-        visited.append(node)
-        children = list(node.iter_children_nodes())
-        if len(children) == 0:
-            paths.append(visited.copy())
-        elif len(children) == 1:
-            next_node = children[0]
-            self._fill_nodeseq(next_node, visited, paths)
-        else:
-            for next_node in children:
-                self._fill_nodeseq(next_node, visited.copy(), paths)
-    
\ No newline at end of file
+                    cur_data.prev_nodeid = id(node)
+                    node.store_output(cur_data)
+                    if task is not None:
+                        # never wait for a free slot while holding a task
+                        self.start_in_new_thread(*task)
+                        task = None
+                    flow = self.flow
+                    if data is None:
+                        self.acquire(slots)
+                        flow = WorkerFlow(len(list(node.bfs())), on_finished=slots.release)
+                    for child in children[1:]:
+                        self.run_in_new_thread(child, cur_data, flow)
+                    task = (children[0], cur_data, flow)
+                    flow.add_task()
+            except BaseException:
+                # the held task is already counted by its flow
+                if task is not None:
+                    self.start_in_new_thread(*task)
+                raise
+            if task is None:
+                return
+
+            node, data, flow = task
+            self.flow.task_done()
+            self.flow = flow
+
+
+class BatchWorker(QRunnable):
+    """Runs a batch of files through a `headless.Pipeline` and writes the
+    summary table.
+
+    The files go to worker processes (see `headless.run_batch`), this
+    thread only collects their summary rows, no dataset is kept. Progress
+    is reported with `ThreadSignalManager().batch_progress`, the end with
+    `batch_finished`; cancelling `token` stops the batch after the files
+    in flight.
+    """
+    def __init__(self, pipeline, loader, files: list, table_path: str, token=None):
+        super().__init__()
+        self.pipeline = pipeline
+        self.loader = loader
+        self.files = list(files)
+        self.table_path = table_path
+        self.token = token if token is not None else RunToken()
+
+    def run(self):
+        signals = ThreadSignalManager()
+        rows, failed, done = [], 0, 0
+        signals.batch_progress.emit(done, len(self.files))
+        try:
+            for path, result, error in headless.run_batch(self.pipeline, self.files,
+                                                          loader=self.loader,
+                                                          abort=self.token.check):
+                done += 1
+                if error is not None:
+                    failed += 1
+                    rows.append(dict(file=path, error=repr(error)))
+                    print(f"batch: FAILED {path}: {error!r}")
+                else:
+                    rows.extend(result['rows'])
+                signals.batch_progress.emit(done, len(self.files))
+        except RunCancelled:
+            pass
+        except Exception as error:
+            signals.batch_finished.emit(f"Batch run failed: {error!r}")
+            raise error
+        table_path = headless.write_table(rows, self.table_path)
+        stopped = '' if done == len(self.files) else f", stopped after {done} of {len(self.files)}"
+        signals.batch_finished.emit(f"{done - failed} files done, {failed} failed{stopped}.<br>"
+                                    f"Summary: {table_path}")
+
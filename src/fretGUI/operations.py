@@ -0,0 +1,303 @@
+"""
+Computations of the pipeline nodes, without Qt.
+
+Every loader and analysis step is registered under the type of the node
+that runs it ('Analysis.CalcBGNode', ...). It takes the node parameters
+as a dict keyed by widget name, the way they are stored in the 'custom'
+section of a saved session. The GUI nodes call `run` and `load` with the
+values of their widgets, `headless` with the values of a session file.
+
+CPU-bound fretbursts methods go through the `call` argument, by default
+`process_backend.call_method` on the calling thread; the GUI nodes pass
+`ExecutionBackend().call`.
+
+This module must not import Qt, it is used by headless worker processes.
+"""
+import os
+import threading
+from copy import copy, deepcopy
+
+import fretbursts
+import numpy as np
+from fretbursts.burstlib import Data
+
+import process_backend
+from misc import burst_table, bva
+from misc.fcsfiles import ConfoCor2Raw
+from misc.photon_sidecar import photon_hdf5_mmap
+
+# node type -> function(data, params, call) -> Data
+OPERATIONS = {}
+# node type -> function(path, params, abort) -> Data
+LOADERS = {}
+
+
+def operation(node_type: str):
+    def register(func):
+        OPERATIONS[node_type] = func
+        return func
+    return register
+
+
+def loader(node_type: str):
+    def register(func):
+        LOADERS[node_type] = func
+        return func
+    return register
+
+
+def run(node_type: str, data: Data, params: dict, call=process_backend.call_method) -> Data:
+    """Apply the step of a node of type `node_type` to `data`.
+
+    `data` may be modified in place, callers pass a copy of shared data.
+    """
+    return OPERATIONS[node_type](data, params, call)
+
+
+def load(node_type: str, path: str, params: dict, abort=None) -> Data:
+    """Load `path` with the loader node of type `node_type`.
+
+    `abort` is called between the chunks of long reads, it stops the
+    loading by raising.
+    """
+    return LOADERS[node_type](path, params, abort)
+
+
+def cow_copy(data: Data) -> Data:
+    """Deep copy of `data` that shares per-photon arrays with the original"""
+    memo = dict()
+    for field in Data.ph_fields:
+        if data.get(field) is None:
+            continue
+        for array in data[field]:
+            memo[id(array)] = array
+    return deepcopy(data, memo)
+
+
+# PyTables is not thread-safe, HDF5 files are read one at a time
+HDF5_LOCK = threading.Lock()
+
+
+def read_photon_hdf5(path):
+    with HDF5_LOCK:
+        return fretbursts.loader.photon_hdf5(path)
+
+
+@loader('Loaders.PhHDF5Node')
+def load_photon_hdf5(path, params, abort=None):
+    if params.get('Loading') == 'Memory-mapped':
+        return photon_hdf5_mmap(path, read=read_photon_hdf5)
+    return read_photon_hdf5(path)
+
+
+@loader('Loaders.LSM510Node')
+def load_confocor2(path, params, abort=None):
+    with ConfoCor2Raw(path) as fcs:
+        # channel 0 is the acceptor
+        timestamps, detectors = fcs.photons(abort=abort)
+        timestamps_unit = 1.0/fcs.frequency
+    data = fretbursts.Data(ph_times_m=[timestamps], A_em=[detectors],
+                           clk_p=timestamps_unit, alternated=False, nch=1,
+                           fname=path, meas_type='smFRET')
+    data.name = os.path.basename(path)
+    return data
+
+
+@operation('Analysis.AlexNode')
+def alex_apply_period(data, params, call):
+    fretbursts.loader.alex_apply_period(data, False)
+    return data
+
+
+@operation('Analysis.CalcBGNode')
+def calc_bg(data, params, call):
+    return call(data, 'calc_bg', fretbursts.bg.exp_fit,
+                time_s=params['Period, s'], tail_min_us=params['Min. lag, μs'])
+
+
+# correction factor -> widget name of the corrections node
+CORRECTIONS = {'gamma': 'Gamma', 'leakage': 'Leakage', 'dir_ex': 'Direct ex.'}
+
+
+def correction_spec(params: dict) -> dict:
+    """Correction factors of the corrections node parameters `params`"""
+    return {factor: params[name] for factor, name in CORRECTIONS.items()}
+
+
+def apply_corrections(data: Data, gamma: float, leakage: float, dir_ex: float) -> Data:
+    """`data` with the correction factors `gamma`, `leakage` and `dir_ex`.
+
+    `data` is not modified. The factors replace those of `data`: the
+    corrected na, nt, E and S are computed from its counts, vectorized,
+    without counting the photons of the bursts again, and stored in a
+    shallow copy of `data` that shares everything else (bursts,
+    background, photons). `gamma` and `leakage` (scalars or one value per
+    channel) are multiplied by the per-channel factors `chi_ch`, as in
+    fretbursts. Direct excitation only applies to ALEX data. Data without
+    bursts and PAX data are corrected by fretbursts, on a copy.
+    """
+    if 'mburst' not in data or 'PAX' in data.meas_type:
+        data = cow_copy(data)
+        data.gamma = gamma
+        data.leakage = leakage
+        data.dir_ex = dir_ex
+        if hasattr(data, 'num_bursts') and data.num_bursts[0] > 0:
+            # Recalculate E values for existing bursts
+            data.calc_fret()
+        return data
+
+    alternated = data.alternated
+    # per-channel factors as `Data.get_gamma_array` / `get_leakage_array`,
+    # which would scale a per-channel factor of `data` by chi_ch in place
+    chi_ch = np.broadcast_to(np.asarray(data.chi_ch, dtype=np.float64), (data.nch,))
+    gamma_ch = np.broadcast_to(gamma, (data.nch,)) * chi_ch
+    leakage_ch = np.broadcast_to(leakage, (data.nch,)) * chi_ch
+    if data.leakage_corrected:
+        old_leakage = np.broadcast_to(data.leakage, (data.nch,)) * chi_ch
+    else:
+        old_leakage = np.zeros(data.nch)
+    old_dir_ex = data.dir_ex if alternated and data.dir_ex_corrected else 0.
+    new_dir_ex = dir_ex if alternated else 0.
+    recount = (np.any(old_leakage != 0) or old_dir_ex != 0 or np.any(leakage_ch != 0)
+               or new_dir_ex != 0)
+    na_list, nt_list, E_list, S_list = [], [], [], []
+    for ich in range(data.nch):
+        nd, na = data.nd[ich], data.na[ich]
+        naa = data.naa[ich] if alternated else None
+        # counts before the corrections of `data`, then the new ones in
+        # the order of fretbursts
+        if old_leakage[ich] != 0:
+            na = na + nd * old_leakage[ich]
+        if old_dir_ex != 0:
+            na = na + naa * old_dir_ex
+        if leakage_ch[ich] != 0:
+            na = na - nd * leakage_ch[ich]
+        if new_dir_ex != 0:
+            na = na - naa * new_dir_ex
+        nt = data.nt[ich]
+        if recount:
+            nt = nd + na
+            if data.ALEX:
+                nt = nt + naa
+        na_list.append(na)
+        nt_list.append(nt)
+        g = gamma_ch[ich]
+        E_list.append(na / (g * nd + na))
+        if alternated:
+            S_list.append((g * nd + na) / (g * nd + na + naa / data.beta))
+
+    corrected = copy(data)
+    for attr in ('ES_binwidth', 'ES_hist', 'E_fitter', 'S_fitter'):
+        if hasattr(corrected, attr):
+            corrected.delete(attr, warning=False)
+    corrected.add(na=na_list, nt=nt_list, E=E_list,
+                  _gamma=np.asarray(gamma, dtype=np.float64),
+                  _leakage=np.asarray(leakage, dtype=np.float64), leakage_corrected=True,
+                  _dir_ex=float(dir_ex))
+    if alternated:
+        corrected.add(S=S_list, dir_ex_corrected=True)
+    return corrected
+
+
+@operation('Analysis.CorrectionsNode')
+def corrections(data, params, call):
+    return apply_corrections(data, **correction_spec(params))
+
+
+@operation('Analysis.DitherNode')
+def dither(data, params, call):
+    return call(data, 'dither', params['LSB'])
+
+
+@operation('Analysis.BurstSearchNodeRate')
+def burst_search_rate(data, params, call):
+    return call(data, 'burst_search', m=params['m, Photon search window'],
+                L=params['L, Minimal Burst size'], min_rate_cps=params['Min. rate cps'])
+
+
+@operation('Analysis.BurstSearchNodeFromBG')
+def burst_search_bg(data, params, call):
+    return call(data, 'burst_search', m=params['m, Photon search window'],
+                L=params['L, Minimal Burst size'], F=params['F, Min. Burst rate to bg. ratio'],
+                ph_sel=fretbursts.Ph_sel(Dex=params['Channel']))
+
+
+@operation('Analysis.FuseBurstsNode')
+def fuse_bursts(data, params, call):
+    return call(data, 'fuse_bursts', ms=params['Delay, ms'])
+
+
+@operation('Analysis.BVANode')
+def bva_sigma_E(data, params, call):
+    n = params['n, Photons per sub-burst']
+    data.add(E_sub_std=bva.bva_data(data, n), bva_n=n, bva_bursts=bva.bursts_key(data))
+    return data
+
+
+# selector node type -> (fretbursts.select_bursts function, {argument: widget name})
+SELECTORS = {
+    'BurstSelectorSizeNode': ('size', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorENode': ('E', {'E1': 'Low Threshold', 'E2': 'High Threshold'}),
+    'BurstSelectorBrightnessNode': ('brightness', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorConsecutiveNode': ('consecutive', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorNANode': ('na', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorNABGNode': ('na_bg', {'F': 'Low Threshold'}),
+    'BurstSelectorNDNode': ('nd', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorNDBGNode': ('nd_bg', {'F': 'Low Threshold'}),
+    'BurstSelectorPeakPhrateNode': ('peak_phrate', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorPeriodNode': ('period', {'bp1': 'Low Threshold', 'bp2': 'High Threshold'}),
+    'BurstSelectorSBRNode': ('sbr', {'th1': 'Low Threshold', 'th2': 'High Threshold'}),
+    'BurstSelectorSingleNode': ('single', {'th': 'Time, ms'}),
+    'BurstSelectorTimeNode': ('time', {'time_s1': 'Low Threshold', 'time_s2': 'High Threshold'}),
+    'BurstSelectorTopNMaxRateNode': ('topN_max_rate', {'N': 'N'}),
+    'BurstSelectorTopNNDANode': ('topN_nda', {'N': 'N'}),
+    'BurstSelectorTopNSBRNode': ('topN_sbr', {'N': 'N'}),
+    'BurstSelectorWidthNode': ('width', {'th1': 'Longer than, ms', 'th2': 'Shorter than, ms'}),
+}
+
+
+# selections that keep or drop every burst on its own values and do not add
+# fields to the data: applied to the unselected bursts they give the same
+# result as after the selectors above them, so selector chains can be fused
+FUSABLE_SELECTORS = {'size', 'E', 'brightness', 'na', 'na_bg', 'nd', 'nd_bg',
+                     'peak_phrate', 'period', 'time', 'width'}
+
+
+def _selector_kwargs(node_type: str, params: dict) -> dict:
+    arguments = SELECTORS[node_type.split('.')[-1]][1]
+    return {argument: params[name] for argument, name in arguments.items()}
+
+
+def _selector(select_func, node_type):
+    def select(data, params, call):
+        if is_fusable(node_type):
+            masks, str_sel = selector_mask(node_type, data, params)
+            return data.select_bursts_mask_apply(masks, computefret=True, str_sel=str_sel)
+        return data.select_bursts(select_func, **_selector_kwargs(node_type, params))
+    return select
+
+
+def is_fusable(node_type: str) -> bool:
+    """True if the selector `node_type` can be applied with `selector_mask`"""
+    return SELECTORS[node_type.split('.')[-1]][0] in FUSABLE_SELECTORS
+
+
+def selector_mask(node_type: str, data: Data, params: dict):
+    """Per-channel burst masks of the fusable selector `node_type` and the
+    selection string, without filtering `data`.
+
+    The masks are computed on the burst table of `data`
+    (`misc.burst_table`), shared by all the selectors reading it.
+    """
+    select_name = SELECTORS[node_type.split('.')[-1]][0]
+    kwargs = _selector_kwargs(node_type, params)
+    result = burst_table.selection_masks(data, select_name, **kwargs)
+    if result is None:
+        select_func = getattr(fretbursts.select_bursts, select_name)
+        result = data.select_bursts_mask(select_func, return_str=True, **kwargs)
+    return result
+
+
+for _name, (_func, _arguments) in SELECTORS.items():
+    operation(f'Selectors.{_name}')(
+        _selector(getattr(fretbursts.select_bursts, _func), f'Selectors.{_name}'))
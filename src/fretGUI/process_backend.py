@@ -0,0 +1,171 @@
+"""
+Process-pool execution of CPU-bound `fretbursts.Data` methods.
+
+`calc_bg`, `burst_search` and `fuse_bursts` hold the GIL for most of their
+run time, so node workers on the thread pool can not use more than one
+core. `ProcessBackend.call` runs such a method in a worker process instead.
+
+Photon arrays (`Data.ph_fields`) are never pickled: they are copied once
+into shared memory, and the worker process maps them back as numpy arrays.
+On the way back the same arrays are replaced by references to the original
+arrays of the GUI process, so only the new results (background, bursts,
+FRET values) travel through the pipe.
+
+This module must not import Qt, it is imported by the worker processes.
+"""
+import io
+import os
+import pickle
+import threading
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+from fretbursts.burstlib import Data
+
+
+def call_method(data: Data, method: str, *args, **kwargs) -> Data:
+    """Call `data.<method>(*args, **kwargs)` and return the resulting Data.
+
+    Methods that modify `data` in place (`calc_bg`, `burst_search`) return
+    `data` itself, methods that build a new object (`fuse_bursts`) return it.
+    """
+    res = getattr(data, method)(*args, **kwargs)
+    return res if isinstance(res, Data) else data
+
+
+def iter_photon_arrays(data: Data):
+    for field in Data.ph_fields:
+        if data.get(field) is None:
+            continue
+        for array in data[field]:
+            if isinstance(array, np.ndarray) and array.size > 0:
+                yield array
+
+
+class _RefPickler(pickle.Pickler):
+    """Pickler replacing arrays from `refs` (id -> key) by their key"""
+    def __init__(self, file, refs):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.refs = refs
+
+    def persistent_id(self, obj):
+        if isinstance(obj, np.ndarray):
+            return self.refs.get(id(obj))
+        return None
+
+
+class _RefUnpickler(pickle.Unpickler):
+    """Unpickler resolving keys written by `_RefPickler` with `arrays`"""
+    def __init__(self, file, arrays):
+        super().__init__(file)
+        self.arrays = arrays
+
+    def persistent_load(self, key):
+        return self.arrays[key]
+
+
+def dumps(obj, refs: dict) -> bytes:
+    buffer = io.BytesIO()
+    _RefPickler(buffer, refs).dump(obj)
+    return buffer.getvalue()
+
+
+def loads(payload: bytes, arrays: dict):
+    return _RefUnpickler(io.BytesIO(payload), arrays).load()
+
+
+def _run_in_worker(payload, segments, method, args, kwargs):
+    """Executed in the worker process.
+
+    `segments` maps shared memory names to (shape, dtype) of the photon
+    arrays referenced in `payload`.
+    """
+    opened = []
+    arrays = dict()
+    try:
+        for name, (shape, dtype) in segments.items():
+            shm = shared_memory.SharedMemory(name=name)
+            opened.append(shm)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        data = loads(payload, arrays)
+        res = call_method(data, method, *args, **kwargs)
+        refs = {id(array): name for name, array in arrays.items()}
+        return dumps(res, refs)
+    finally:
+        # arrays built on shared buffers must be gone before closing them
+        data = res = arrays = None
+        for shm in opened:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+
+class ProcessBackend:
+    """Runs `Data` methods on a pool of worker processes.
+
+    Shared memory segments are created the first time a photon array is
+    sent and are released when the array is garbage collected in the GUI
+    process, so all nodes working on the same file reuse one segment.
+
+    `interrupt` is called every `POLL_INTERVAL` seconds while a call waits
+    for its result. If it raises, the call is abandoned with that exception;
+    the worker process finishes the method in the background.
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, max_workers: int = None, interrupt=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self.interrupt = interrupt
+        # fork is unsafe in a process running Qt threads
+        self.__executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'))
+        self.__lock = threading.Lock()
+        self.__segments = dict()  # id(array) -> (name, shape, dtype)
+
+    def __share(self, array: np.ndarray):
+        with self.__lock:
+            if id(array) in self.__segments:
+                return self.__segments[id(array)]
+            shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            segment = (shm.name, array.shape, array.dtype.str)
+            self.__segments[id(array)] = segment
+            weakref.finalize(array, self.__release, id(array), shm)
+            return segment
+
+    def __release(self, array_id, shm):
+        with self.__lock:
+            self.__segments.pop(array_id, None)
+        shm.close()
+        shm.unlink()
+
+    def call(self, data: Data, method: str, *args, **kwargs) -> Data:
+        """Same as `call_method`, executed in a worker process"""
+        refs, arrays, segments = dict(), dict(), dict()
+        for array in iter_photon_arrays(data):
+            name, shape, dtype = self.__share(array)
+            refs[id(array)] = name
+            arrays[name] = array
+            segments[name] = (shape, dtype)
+        payload = dumps(data, refs)
+        future = self.__executor.submit(_run_in_worker, payload, segments,
+                                        method, args, kwargs)
+        while True:
+            try:
+                return loads(future.result(timeout=self.POLL_INTERVAL), arrays)
+            except TimeoutError:
+                pass
+            if self.interrupt is not None:
+                try:
+                    self.interrupt()
+                except BaseException:
+                    future.cancel()
+                    raise
+
+    def shutdown(self):
+        self.__executor.shutdown(cancel_futures=True)
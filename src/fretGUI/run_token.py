@@ -0,0 +1,57 @@
+"""
+Generation tokens of graph runs.
+
+Every run of the graph gets a new `RunToken`, shared by all the workers of
+that run. A newer run cancels the token of the older one: its workers stop
+at the next node boundary, and long calls that are split in chunks (file
+loading, calls sent to the process backend) give up at the next chunk by
+calling `check_cancelled`, which raises `RunCancelled`.
+
+The token of the run is bound to the thread executing it, so code deep in
+a node does not need it passed down explicitly.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class RunCancelled(Exception):
+    """Raised in a worker whose run was superseded by a newer one"""
+
+
+class RunToken:
+    __local = threading.local()
+
+    def __init__(self):
+        self.__cancelled = False
+
+    def cancel(self):
+        self.__cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self.__cancelled
+
+    def check(self):
+        if self.__cancelled:
+            raise RunCancelled()
+
+    @contextmanager
+    def bind(self):
+        """Make this token current on the calling thread"""
+        previous = getattr(RunToken.__local, 'token', None)
+        RunToken.__local.token = self
+        try:
+            yield self
+        finally:
+            RunToken.__local.token = previous
+
+    @staticmethod
+    def current():
+        """Token bound to the calling thread, None outside of a run"""
+        return getattr(RunToken.__local, 'token', None)
+
+
+def check_cancelled():
+    """Raise `RunCancelled` if the run of the calling thread was superseded"""
+    token = RunToken.current()
+    if token is not None:
+        token.check()
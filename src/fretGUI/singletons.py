@@ -1,11 +1,18 @@
 from Qt.QtCore import Signal
 from Qt.QtCore import QObject
 from Qt.QtCore import QMutex, QMutexLocker, QTimer
-from copy import deepcopy
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import json
+import os
+import threading
 import time
-import queue
 import pickle
 import hashlib
+import numpy as np
+from fretbursts.burstlib import Data
+from disk_cache import DiskCache
+from run_token import check_cancelled
 
 
 class SingletonMeta(type(QObject)):
@@ -25,6 +32,9 @@ class ThreadSignalManager(QObject, metaclass=SingletonMeta):
     thread_error = Signal(str)
     all_thread_finished = Signal()
     run_btn_clicked = Signal()
+    node_changed = Signal(object)
+    batch_progress = Signal((int, int))
+    batch_finished = Signal(str)
     
     
 class NodeStateManager(QObject, metaclass=SingletonMeta):
@@ -71,63 +81,414 @@ class EventDebouncer(metaclass=SingletonMeta):
     
     
 class FBSDataCash(metaclass=SingletonMeta):
+    """Results of cached nodes, keyed by `make_hash`.
+
+    The cache is an LRU bounded by the size of the numpy buffers its entries
+    hold. Photon arrays are shared between most entries (see `FBSData.copy`)
+    and are counted once, while they are referenced by at least one entry.
+    Memory misses fall back to `disk`, a `disk_cache.DiskCache` kept across
+    sessions.
+    """
+    DEFAULT_MAX_BYTES = 2 * 1024**3
+
     def __init__(self):
-        self.__max_size = 50
-        self.__table = dict()
-        self.__time_q = queue.PriorityQueue()
+        self.__max_bytes = self.DEFAULT_MAX_BYTES
+        self.__table = OrderedDict()  # hash -> (fbsdata, own arrays, shared arrays)
+        self.__shared = dict()  # id(array) -> [nbytes, number of entries]
+        self.__nbytes = 0
+        # memory hits, memory misses read from disk, and results computed
+        # (neither in memory nor on disk): each lookup counts once
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
         self.mutex = QMutex()
+        self.disk = DiskCache()
         
     @property
     def size(self):
         return len(self.__table)
+
+    @property
+    def nbytes(self):
+        return self.__nbytes
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+    def set_max_bytes(self, max_bytes: int):
+        with QMutexLocker(self.mutex):
+            self.__max_bytes = max_bytes
+            self.__evict()
+
+    def clear(self):
+        with QMutexLocker(self.mutex):
+            while self.__table:
+                self.__pop_oldest()
+
+    def stats(self) -> dict:
+        with QMutexLocker(self.mutex):
+            return dict(entries=self.size, nbytes=self.__nbytes,
+                        max_bytes=self.__max_bytes, hits=self.hits,
+                        misses=self.misses, evictions=self.evictions,
+                        disk_hits=self.disk_hits, disk_nbytes=self.disk.nbytes,
+                        disk_max_bytes=self.disk.max_bytes)
     
-    def fbscash(self, foo):
+    def fbscash(self, foo=None, copy_input=True):
+        """Cache the results of a node `execute` method.
+
+        The input is copied before `foo` runs, since it is shared between
+        sibling branches. Nodes that never modify their input (selectors)
+        use `fbscash(copy_input=False)`; their results are only kept in
+        memory, recomputing them costs less than reading them from disk.
+        """
+        if foo is None:
+            return lambda foo: self.fbscash(foo, copy_input)
+
         def wrapper(node, fbsdata, *args, **kwargs):    
             
             if fbsdata is None:
                 return [None]
+            if fbsdata.cache_key is None:
+                return foo(node, fbsdata.copy() if copy_input else fbsdata, *args, **kwargs)
             
             hash = FBSDataCash.make_hash(node, fbsdata)
             with QMutexLocker(self.mutex):
                 if hash in self.__table:
-                    new_fbsdata = self.get_datacopy(hash, node, fbsdata)
-                    return [new_fbsdata]
+                    self.hits += 1
+                    NodeProfiler().annotate(cache='hit')
+                    cached = self.get_data(hash)
+                    # new wrapper, the cached one may be in use by another node
+                    return [fbsdata.with_data_of(cached, hash)]
+
+            if not copy_input:
+                NodeProfiler().annotate(cache='miss')
+                res = foo(node, fbsdata, *args, **kwargs)
+                res[0].cache_key = hash
+                with QMutexLocker(self.mutex):
+                    self.misses += 1
+                    self.put_data(hash, res[0])
+                return res
+
+            data = self.disk.get(hash, fbsdata.data)
+            if data is not None:
+                res = [fbsdata.with_data(data, hash)]
+                with QMutexLocker(self.mutex):
+                    self.disk_hits += 1
+                    self.put_data(hash, res[0])
+                NodeProfiler().annotate(cache='disk')
+                return res
+            NodeProfiler().annotate(cache='miss')
           
-            res = foo(node, fbsdata, *args, **kwargs)
+            # data is shared between sibling branches, never modify it in place
+            res = foo(node, fbsdata.copy(), *args, **kwargs)
+            res[0].cache_key = hash
             with QMutexLocker(self.mutex):
-                if self.size >= self.__max_size:
-                    self.remove_oldest()
-                self.put_data(hash, node, res[0])
+                self.misses += 1
+                self.put_data(hash, res[0])
+            try:
+                self.disk.put(hash, res[0].data, fbsdata.data)
+            except Exception as error:
+                # not picklable (lambdas, local classes in the Data) or not
+                # writable: the result is only kept in memory
+                print(f'disk cache: can not store {node.type_}: {error!r}')
             return res
         return wrapper
         
-    def get_datacopy(self, hash, node, data):
-        cur_time = time.perf_counter()
-        self.__time_q.put_nowait((cur_time, hash))
-        return self.__table[hash].copy()
-    
-    def put_data(self, hash, node, data):
-        cur_time = time.perf_counter()
-        self.__table[hash] = data.copy()
-        self.__time_q.put_nowait((cur_time, hash))
-            
-    def remove_oldest(self):
-        while self.__time_q.not_empty:
-            time, hash = self.__time_q.get_nowait()
-            if hash in self.__table:
-                self.__table.pop(hash)
-                break
+    def get_data(self, hash):
+        self.__table.move_to_end(hash)
+        return self.__table[hash][0]
+    
+    def put_data(self, hash, fbsdata):
+        if hash in self.__table:
+            self.__table.move_to_end(hash)
+            return
+        own, shared = FBSDataCash.split_arrays(fbsdata.source_data)
+        if fbsdata.burst_masks is not None or fbsdata.corrections is not None:
+            # pending selection and corrections share the bursts of their input entry
+            own = sum(mask.nbytes for mask in fbsdata.burst_masks or ())
+        for array in shared:
+            entry = self.__shared.setdefault(id(array), [array.nbytes, 0])
+            if entry[1] == 0:
+                self.__nbytes += entry[0]
+            entry[1] += 1
+        self.__nbytes += own
+        self.__table[hash] = (fbsdata, own, shared)
+        fbsdata.on_materialize(lambda fbsdata, hash=hash: self.__charge_materialized(hash, fbsdata))
+        self.__charge_materialized(hash, fbsdata, lock=False)
+        self.__evict()
+
+    def __charge_materialized(self, hash, fbsdata, lock=True):
+        """Account the arrays `fbsdata` built for its pending state since it
+        was stored (corrected and selected Data, burst tables) to its entry"""
+        if lock:
+            with QMutexLocker(self.mutex):
+                self.__charge_materialized(hash, fbsdata, lock=False)
+                self.__evict()
+            return
+        entry = self.__table.get(hash)
+        if entry is None or entry[0] is not fbsdata:
+            return  # evicted meanwhile
+        _, own, shared = entry
+        # arrays of the source data are already charged as own bytes
+        source = fbsdata.source_data
+        known = (set(FBSDataCash.own_arrays(source)) | set(FBSDataCash.photon_arrays(source))
+                 | {id(array) for array in shared})
+        built = [array for key, array in FBSDataCash.own_arrays(fbsdata.materialized()).items()
+                 if key not in known]
+        # refcounted like the photons, entries sharing the built data charge it once
+        for array in built:
+            counter = self.__shared.setdefault(id(array), [array.nbytes, 0])
+            if counter[1] == 0:
+                self.__nbytes += counter[0]
+            counter[1] += 1
+        self.__table[hash] = (fbsdata, own, shared + built)
+
+    def __evict(self):
+        while self.__nbytes > self.__max_bytes and self.__table:
+            self.__pop_oldest()
+            self.evictions += 1
+
+    def __pop_oldest(self):
+        _, (_, own, shared) = self.__table.popitem(last=False)
+        self.__nbytes -= own
+        for array in shared:
+            entry = self.__shared[id(array)]
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.__nbytes -= entry[0]
+                self.__shared.pop(id(array))
+
+    @staticmethod
+    def split_arrays(data):
+        """Return (bytes of arrays owned by `data`, list of photon arrays)"""
+        shared = FBSDataCash.photon_arrays(data)
+        own = FBSDataCash.own_arrays(data)
+        own_bytes = sum(array.nbytes for key, array in own.items() if key not in shared)
+        return own_bytes, list(shared.values())
+
+    @staticmethod
+    def photon_arrays(data) -> dict:
+        """In-memory photon arrays of `data` by id"""
+        shared = dict()
+        for field in Data.ph_fields:
+            if data.get(field) is None:
+                continue
+            for array in data[field]:
+                # memory-mapped photons are paged in and out by the OS
+                if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+                    shared[id(array)] = array
+        return shared
+
+    @staticmethod
+    def own_arrays(obj) -> dict:
+        """In-memory arrays reachable from `obj` (Data, lists, dicts), by id,
+        without the photon arrays of Data"""
+        own = dict()
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, Data):
+                stack.extend(value for key, value in obj.items() if key not in Data.ph_fields)
+            elif isinstance(obj, np.ndarray):
+                if not isinstance(obj, np.memmap):
+                    own[id(obj)] = obj
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+            elif isinstance(obj, dict):
+                stack.extend(obj.values())
+            elif isinstance(getattr(obj, 'data', None), np.ndarray):
+                stack.append(obj.data)  # fretbursts Bursts
+        return own
 
     @staticmethod        
     def make_hash(node, data):
+        """Key of the output of `node` for input `data`.
+
+        Combines the key of the input (file fingerprint and path, and all
+        upstream nodes) with the type and widget values of `node`, photon
+        arrays are never hashed.
+        """
         values = [widget.get_value() for name, widget in node.widgets().items()]
-        values.append(data.data)
-        values.append(id(node))
-        pickle_ = pickle.dumps(values)
+        return FBSDataCash.chain_key(data.cache_key, node.type_, values)
+
+    @staticmethod
+    def chain_key(parent_key: str, node_type: str, values=None) -> str:
+        pickle_ = pickle.dumps([parent_key, node_type, values])
         hash_hex = hashlib.sha256(pickle_).hexdigest()
         return hash_hex
 
 
+class GraphTopology(metaclass=SingletonMeta):
+    """Connections of the graph nodes, kept up to date by their
+    `on_input_connected` / `on_input_disconnected` events.
+
+    Roots, leaves, topological order, descendants and the input port
+    connected to a given parent are computed from it once per change of
+    the connections and cached, instead of rescanning the ports on every
+    call. Safe to read from the node workers.
+    """
+    def __init__(self):
+        self.mutex = QMutex()
+        # node -> [(input port, connected output port)], in connection order
+        self.__inputs = dict()
+        self.version = 0
+        self.__cache = dict()
+        self.__unverified = []
+
+    def connect(self, in_port, out_port):
+        with QMutexLocker(self.mutex):
+            edges = self.__inputs.setdefault(in_port.node(), [])
+            if (in_port, out_port) not in edges:
+                edges.append((in_port, out_port))
+                self.__changed()
+            if out_port not in in_port.connected_ports():
+                # the event comes before the ports are connected when a
+                # disconnection is undone, and without a connection when a
+                # pasted node can not be connected: checked on the next read
+                self.__unverified.append((in_port, out_port))
+
+    def disconnect(self, in_port, out_port):
+        with QMutexLocker(self.mutex):
+            self.__remove(in_port, out_port)
+
+    def __remove(self, in_port, out_port):
+        edges = self.__inputs.get(in_port.node(), [])
+        if (in_port, out_port) in edges:
+            edges.remove((in_port, out_port))
+            if not edges:
+                self.__inputs.pop(in_port.node())
+            self.__changed()
+
+    def __changed(self):
+        self.version += 1
+        self.__cache.clear()
+
+    def __verify(self):
+        for in_port, out_port in self.__unverified:
+            if out_port not in in_port.connected_ports():
+                self.__remove(in_port, out_port)
+        self.__unverified.clear()
+
+    def __cached(self, key, compute):
+        value = self.__cache.get(key)
+        if value is None:
+            value = self.__cache[key] = compute()
+        return value
+
+    def __children_map(self) -> dict:
+        def compute():
+            children = dict()
+            for node, edges in self.__inputs.items():
+                for in_port, out_port in edges:
+                    children.setdefault(out_port.node(), dict())[node] = None
+            return {parent: tuple(nodes) for parent, nodes in children.items()}
+        return self.__cached('children', compute)
+
+    def __parents(self, node) -> tuple:
+        return tuple(dict.fromkeys(out_port.node() for _, out_port in self.__inputs.get(node, ())))
+
+    def parents(self, node) -> tuple:
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            return self.__parents(node)
+
+    def children(self, node) -> tuple:
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            return self.__children_map().get(node, ())
+
+    def descendants(self, node) -> tuple:
+        """Nodes below `node`, breadth first"""
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            def compute():
+                children = self.__children_map()
+                visited = {node}
+                order = []
+                q = deque([node])
+                while q:
+                    for child in children.get(q.popleft(), ()):
+                        if child not in visited:
+                            visited.add(child)
+                            order.append(child)
+                            q.append(child)
+                return tuple(order)
+            return self.__cached(('descendants', node), compute)
+
+    def root_ancestors(self, node) -> tuple:
+        """Roots above `node`, each shared ancestor visited once"""
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            def compute():
+                if node not in self.__inputs:
+                    return (node,)
+                visited = set()
+                roots = []
+                stack = [node]
+                while stack:
+                    for parent in self.__parents(stack.pop()):
+                        if parent in visited:
+                            continue
+                        visited.add(parent)
+                        if parent in self.__inputs:
+                            stack.append(parent)
+                        else:
+                            roots.append(parent)
+                return tuple(roots)
+            return self.__cached(('roots', node), compute)
+
+    def roots(self, nodes) -> list:
+        """Nodes of `nodes` without connected inputs"""
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            return [node for node in nodes if node not in self.__inputs]
+
+    def leaves(self, nodes) -> list:
+        """Nodes of `nodes` without connected outputs"""
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            children = self.__children_map()
+            return [node for node in nodes if node not in children]
+
+    def topological_order(self, nodes) -> tuple:
+        """`nodes` sorted parents first"""
+        nodes = list(nodes)
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            def compute():
+                children = self.__children_map()
+                node_set = set(nodes)
+                indegree = {node: sum(parent in node_set for parent in self.__parents(node))
+                            for node in nodes}
+                q = deque(node for node in nodes if indegree[node] == 0)
+                order = []
+                while q:
+                    node = q.popleft()
+                    order.append(node)
+                    for child in children.get(node, ()):
+                        if child in node_set:
+                            indegree[child] -= 1
+                            if indegree[child] == 0:
+                                q.append(child)
+                return tuple(order)
+            return self.__cached(('order', tuple(map(id, nodes))), compute)
+
+    def input_port(self, node, parent_id: int):
+        """First input port of `node` connected to the node with id `parent_id`, or None"""
+        with QMutexLocker(self.mutex):
+            self.__verify()
+            def compute():
+                ports = dict()
+                edges = sorted(self.__inputs.get(node, ()),
+                               key=lambda edge: node.input_ports().index(edge[0]))
+                for in_port, out_port in edges:
+                    ports.setdefault(id(out_port.node()), in_port)
+                return ports
+            return self.__cached(('ports', node), compute).get(parent_id)
+
+
 class FBSDataIDGenerator(metaclass=SingletonMeta):
     """Singleton to generate unique integer IDs for FBSData objects"""
     def __init__(self):
@@ -141,4 +502,196 @@ class FBSDataIDGenerator(metaclass=SingletonMeta):
             return self.__counter
     
     
-    
\ No newline at end of file
+    
+
+class ExecutionBackend(metaclass=SingletonMeta):
+    """Selects where CPU-bound analysis methods are executed.
+
+    'threads' runs them on the calling node worker thread, 'processes'
+    sends them to a `process_backend.ProcessBackend` worker pool, which is
+    started on first use. Only the latter can be abandoned when the run is
+    cancelled, a fretbursts call on a thread always runs to the end.
+    """
+    MODES = ('threads', 'processes')
+
+    def __init__(self):
+        self.mode = 'threads'
+        self.__process_backend = None
+        self.mutex = QMutex()
+
+    def set_mode(self, mode: str):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown execution backend {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+
+    def call(self, data, method: str, *args, **kwargs):
+        """Run `data.<method>(*args, **kwargs)`, return the resulting Data"""
+        import process_backend
+        if self.mode == 'threads':
+            return process_backend.call_method(data, method, *args, **kwargs)
+        with QMutexLocker(self.mutex):
+            if self.__process_backend is None:
+                self.__process_backend = process_backend.ProcessBackend(interrupt=check_cancelled)
+        return self.__process_backend.call(data, method, *args, **kwargs)
+
+
+class NodeProfiler(metaclass=SingletonMeta):
+    """Per-node spans of graph runs, recorded while `enabled` is set.
+
+    A span is recorded for every node execution (per dataset), file load
+    and plot redraw: wall and CPU time of the thread, cache hit or miss,
+    size of the resulting dataset and the bytes it allocated, i.e. numpy
+    arrays of the output that are not in the input (results taken from the
+    cache allocate nothing). Spans can be exported as Chrome trace events,
+    to open in chrome://tracing or https://ui.perfetto.dev.
+    """
+    MAX_RECORDS = 100_000
+
+    @staticmethod
+    def array_sizes(data) -> dict:
+        """nbytes of the numpy arrays held by `data`, by array id"""
+        sizes = dict()
+        stack = [data]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, np.ndarray):
+                sizes[id(obj)] = obj.nbytes
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+            elif isinstance(obj, dict):
+                stack.extend(obj.values())
+            elif isinstance(getattr(obj, 'data', None), np.ndarray):
+                stack.append(obj.data)  # fretbursts Bursts
+        return sizes
+
+    def __init__(self):
+        self.enabled = False
+        self.mutex = QMutex()
+        self.records = deque(maxlen=self.MAX_RECORDS)
+        # id(node) -> totals of the node in the last run it was executed in
+        self.__totals = dict()
+        self.__run = 0
+        self.__local = threading.local()
+        self.__t0 = time.perf_counter()
+
+    def new_run(self):
+        """Start a new graph run, node totals are reset when rerun"""
+        with QMutexLocker(self.mutex):
+            self.__run += 1
+
+    def clear(self):
+        with QMutexLocker(self.mutex):
+            self.records.clear()
+            self.__totals.clear()
+
+    def start(self, node, fbsdata=None, phase: str = 'execute'):
+        """Open a span of `node` on the calling thread, None if disabled"""
+        if not self.enabled:
+            return None
+        record = dict(node=node.name(), type=node.type_, node_id=id(node), phase=phase,
+                      dataset=None, file=None, cache=None,
+                      thread=threading.get_ident(), thread_name=threading.current_thread().name,
+                      previous=getattr(self.__local, 'record', None),
+                      input_arrays=None, cpu0=time.thread_time(), t0=time.perf_counter())
+        if fbsdata is not None:
+            record['dataset'] = fbsdata.id
+            record['file'] = os.path.basename(fbsdata.path)
+            record['input_arrays'] = NodeProfiler.array_sizes((fbsdata.source_data, fbsdata.burst_masks))
+        self.__local.record = record
+        return record
+
+    def finish(self, record, outputs=()):
+        """Close a span opened by `start`, `outputs` are the resulting FBSData"""
+        if record is None:
+            return
+        record['wall'] = time.perf_counter() - record.pop('t0')
+        record['cpu'] = time.thread_time() - record.pop('cpu0')
+        self.__local.record = record.pop('previous')
+        input_arrays = record.pop('input_arrays') or {}
+        outputs = [fbsdata for fbsdata in outputs if fbsdata is not None]
+        dataset_bytes = allocated = 0
+        for fbsdata in outputs:
+            sizes = NodeProfiler.array_sizes((fbsdata.source_data, fbsdata.burst_masks))
+            dataset_bytes += sum(sizes.values())
+            allocated += sum(nbytes for array_id, nbytes in sizes.items()
+                             if array_id not in input_arrays)
+            if record['file'] is None:
+                record['dataset'] = fbsdata.id
+                record['file'] = os.path.basename(fbsdata.path)
+        record['dataset_bytes'] = dataset_bytes
+        # results from the memory cache are not new, even if not in the input
+        record['allocated_bytes'] = allocated if record['cache'] != 'hit' else 0
+        record['start'] = time.perf_counter() - record['wall'] - self.__t0
+        with QMutexLocker(self.mutex):
+            record['run'] = self.__run
+            self.records.append(record)
+            self.__add_to_totals(record)
+
+    @contextmanager
+    def span(self, node, fbsdata=None, phase: str = 'execute'):
+        """Span around a block, the block sets `outputs` on the yielded list"""
+        record = self.start(node, fbsdata, phase)
+        outputs = []
+        try:
+            yield outputs
+        finally:
+            self.finish(record, outputs)
+
+    def annotate(self, **fields):
+        """Add fields (e.g. cache='hit') to the span open on the calling thread"""
+        record = getattr(self.__local, 'record', None)
+        if record is not None:
+            record.update(fields)
+
+    def __add_to_totals(self, record):
+        totals = self.__totals.get(record['node_id'])
+        if record['phase'] == 'redraw':
+            if totals is None:
+                totals = self.__totals[record['node_id']] = self.__new_totals(record['run'])
+            totals['redraw'] = record['wall']
+            return
+        if totals is None or totals['run'] != record['run']:
+            redraw = totals['redraw'] if totals is not None else None
+            totals = self.__totals[record['node_id']] = self.__new_totals(record['run'])
+            totals['redraw'] = redraw
+        totals['wall'] += record['wall']
+        totals['cpu'] += record['cpu']
+        totals['count'] += 1
+        totals['allocated_bytes'] += record['allocated_bytes']
+        totals['dataset_bytes'] += record['dataset_bytes']
+        if record['cache'] is not None:
+            totals[record['cache']] = totals.get(record['cache'], 0) + 1
+
+    @staticmethod
+    def __new_totals(run):
+        return dict(run=run, wall=0.0, cpu=0.0, count=0, allocated_bytes=0,
+                    dataset_bytes=0, hit=0, miss=0, disk=0, redraw=None)
+
+    def node_totals(self, node):
+        """Totals of `node` in the last run that executed it, None if never profiled"""
+        with QMutexLocker(self.mutex):
+            totals = self.__totals.get(id(node))
+            return dict(totals) if totals is not None else None
+
+    def chrome_trace(self) -> dict:
+        """The recorded spans as Chrome trace events"""
+        with QMutexLocker(self.mutex):
+            records = list(self.records)
+        events = []
+        threads = dict()
+        for record in records:
+            threads.setdefault(record['thread'], record['thread_name'])
+            args = {key: record[key] for key in ('type', 'file', 'dataset', 'cache', 'cpu',
+                                                 'dataset_bytes', 'allocated_bytes', 'run')}
+            args['cpu_ms'] = args.pop('cpu') * 1e3
+            events.append(dict(name=record['node'], cat=record['phase'], ph='X',
+                               ts=record['start'] * 1e6, dur=record['wall'] * 1e6,
+                               pid=os.getpid(), tid=record['thread'], args=args))
+        for tid, name in threads.items():
+            events.append(dict(name='thread_name', ph='M', pid=os.getpid(), tid=tid,
+                               args=dict(name=name)))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def export_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)